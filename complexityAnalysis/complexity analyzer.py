@@ -1,33 +1,22 @@
 #!/usr/bin/env python3
-import json
 import re
 import os
 import sys
 import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from urllib.parse import unquote, urlparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probehub.graphwriter import add_output_arguments, iter_json_array, open_graph
+from probehub.javasource import java_files_under, read_source, source_files
+from probehub.resolver import SymbolTable, TypeResolver, parameter_type
 
-TYPE_MAP = {
-    "Integer": "java.lang.Integer",
-    "String": "java.lang.String",
-    "Boolean": "java.lang.Boolean",
-    "Long": "java.lang.Long",
-    "Double": "java.lang.Double",
-    "Float": "java.lang.Float",
-    "Short": "java.lang.Short",
-    "Byte": "java.lang.Byte",
-    "Character": "java.lang.Character",
-    "Object": "java.lang.Object",
-    "LocalDate": "java.time.LocalDate",
-    "Date": "java.util.Date",
-    "Locale": "java.util.Locale",
-    "List": "java.util.List",
-    "Map": "java.util.Map",
-    "Set": "java.util.Set",
-    "BindingResult": "org.springframework.validation.BindingResult",
-    "Model": "org.springframework.ui.Model",
-}
-
-PRIMITIVE_TYPES = {"int", "boolean", "long", "double", "float", "short", "byte", "char"}
+try:
+    import javalang
+except ImportError:  # only needed for --native
+    javalang = None
 
 
 def normalise_method_name(name: str) -> str:
@@ -49,137 +38,391 @@ def extract_java_fqn(rel_path: str):
     return package, class_name
 
 
-def qualify_argument(arg: str, current_package: str) -> str:
-    arg = arg.strip()
-    if not arg:
-        return arg
-    if arg in PRIMITIVE_TYPES:
-        return arg
-    if arg in TYPE_MAP:
-        return TYPE_MAP[arg]
-    if "." in arg:
-        return arg
-    if arg and arg[0].isupper():
-        return f"{current_package}.{arg}"
-    return f"java.lang.{arg}"
-
-
-def parse_pmd_report(pmd_report_path: str, source_code_dir: str):
-    nodes, edges = [], []
-    class_node_by_fqn = {}
-    method_node_by_fqn = {}
+TEXT_LINE_RE = re.compile(r"^(?:\./)?(?P<file>[\S]+):(?P<line>\d+):\s+(?P<rule>\w+):\s+(?P<msg>.+)$")
+METHOD_MESSAGE_RE = re.compile(r"The method ['\"`]([^'\"`]+)['\"`] has")
+SIGNATURE_RE = re.compile(r"([^(]+)\(([^)]*)\)")
+REPORT_FORMATS = ["auto", "text", "xml", "json", "sarif"]
+
+
+def build_source_index(source_code_dir: str):
+    """Relative paths ('/'-separated) of every file under the source tree, walked once."""
+    return {os.path.relpath(path, source_code_dir).replace(os.sep, "/")
+            for path in source_files(source_code_dir)}
+
+
+def relative_report_path(path: str, source_code_dir: str) -> str:
+    """Report paths may be absolute or relative to the source tree; normalise to the latter."""
+    if os.path.isabs(path):
+        path = os.path.relpath(path, source_code_dir)
+    return os.path.normpath(path).replace(os.sep, "/")
+
+
+class CyclomaticGraph:
+    """Accumulates Issue, Method and Class nodes and their HASISSUE edges."""
+
+    def __init__(self, source_code_dir: str, writer=None):
+        """With a GraphWriter, nodes and edges are streamed to it instead of kept in lists."""
+        self.source_code_dir = source_code_dir
+        self.writer = writer
+        self.source_index = build_source_index(source_code_dir)
+        self.resolver = TypeResolver(SymbolTable.from_sources(source_code_dir, [
+            os.path.join(source_code_dir, rel) for rel in sorted(self.source_index)
+            if rel.endswith(".java")]))
+        self.nodes, self.edges = [], []
+        self.class_node_by_fqn = {}
+        self.method_node_by_fqn = {}
+
+    def _add_node(self, node):
+        if self.writer is not None:
+            self.writer.add_node(node)
+        else:
+            self.nodes.append(node)
+
+    def _add_edge(self, edge):
+        if self.writer is not None:
+            self.writer.add_edge(edge)
+        else:
+            self.edges.append(edge)
+
+    def add_issue(self, rel_path: str, line_no: int, rule: str, message: str,
+                  end_line: int = None, package: str = None, class_name: str = None,
+                  method: str = None):
+        """
+        Text reports only give the path, line and message; structured reports
+        (XML/JSON/SARIF) may also pass the end line and PMD's package, class
+        and method fields, which then take precedence over the path and the
+        message wording.
+        """
+        if rule != "CyclomaticComplexity":
+            return
+
+        issue_id = f"{rel_path}:{line_no}:{rule}:{message}"
+        issue_node = {"type": "Issue", "id": issue_id, "description": message}
+        if end_line is not None:
+            issue_node["beginLine"] = line_no
+            issue_node["endLine"] = end_line
+        self._add_node(issue_node)
+
+        if relative_report_path(rel_path, self.source_code_dir) not in self.source_index:
+            return
+
+        path_package, path_class = extract_java_fqn(rel_path)
+        package = path_package if package is None else package
+        class_name = class_name or path_class
+
+        method_match = METHOD_MESSAGE_RE.search(message)
+        if method or method_match:
+            method_name = normalise_method_name(method_match.group(1)) if method_match else ""
+            m_args = SIGNATURE_RE.match(method_name)
+            if method and (not m_args or m_args.group(1).strip() != method):
+                # PMD's method field carries no parameters; only trust the
+                # message's signature when it names the same method
+                method_name, m_args = method, None
+            fqn_method = f"{package}.{class_name}.{method_name}"
+            if m_args:
+                fqn_method = self.resolver.qualify_signature(
+                    fqn_method, package, self.resolver.symbols.imports_of(f"{package}.{class_name}"))
+
+            if fqn_method not in self.method_node_by_fqn:
+                method_node = {"type": "Method", "fullName": fqn_method}
+                self.method_node_by_fqn[fqn_method] = method_node
+                self._add_node(method_node)
+
+            self._add_edge({
+                "relationName": "HASISSUE",
+                "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": fqn_method},
+                "to": {"nodeType": "Issue", "propertyName": "id", "propertyValue": issue_id},
+            })
+            return
 
-    with open(pmd_report_path, "r", encoding="utf-8") as f:
-        for raw_line in f:
-            line = raw_line.strip()
-            if not line:
-                continue
+        # Class-level warnings and anything unrecognised hang off the class
+        fqn_class = f"{package}.{class_name}"
+        if fqn_class not in self.class_node_by_fqn:
+            class_node = {"type": "Class", "fullName": fqn_class}
+            self.class_node_by_fqn[fqn_class] = class_node
+            self._add_node(class_node)
 
-            m = re.match(
-                r"^(?:\./)?(?P<file>[\S]+):(?P<line>\d+):\s+(?P<rule>\w+):\s+(?P<msg>.+)$",
-                line,
-            )
-            if not m:
-                continue
+        self._add_edge({
+            "relationName": "HASISSUE",
+            "from": {"nodeType": "Class", "propertyName": "fullName", "propertyValue": fqn_class},
+            "to": {"nodeType": "Issue", "propertyName": "id", "propertyValue": issue_id},
+        })
 
-            rel_path = m.group("file")
-            line_no = int(m.group("line")
-            rule = m.group("rule")
-            message = m.group("msg").strip()
+    def to_dict(self):
+        return {"nodes": self.nodes, "edges": self.edges}
 
-            if rule != "CyclomaticComplexity":
-                continue
 
-            issue_id = f"{rel_path}:{line_no}:{rule}:{message}"
-            issue_node = {"type": "Issue", "id": issue_id, "description": message}
-            nodes.append(issue_node)
+# ---------------------------------------------------------------------------
+# PMD report readers. Each yields (path, begin_line, rule, message, fields)
+# one violation at a time, where fields holds whatever structured data the
+# format carries (end_line, package, class_name, method).
+# ---------------------------------------------------------------------------
 
-            abs_path = os.path.normpath(os.path.join(source_code_dir, rel_path))
-            if not os.path.exists(abs_path):
+def iter_text_report(report_path: str):
+    with open(report_path, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            m = TEXT_LINE_RE.match(raw_line.strip())
+            if not m:
                 continue
+            yield m.group("file"), int(m.group("line")), m.group("rule"), m.group("msg").strip(), {}
+
+
+def iter_xml_report(report_path: str):
+    """PMD's xml renderer: <file name=...><violation beginline=... method=...>message</violation>."""
+    current_file = None
+    context = ET.iterparse(report_path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if event == "start":
+            if tag == "file":
+                current_file = elem.get("name")
+            continue
+        if tag == "violation":
+            fields = {}
+            if elem.get("endline"):
+                fields["end_line"] = int(elem.get("endline"))
+            if elem.get("package") is not None:
+                fields["package"] = elem.get("package")
+            if elem.get("class"):
+                fields["class_name"] = elem.get("class")
+            if elem.get("method"):
+                fields["method"] = elem.get("method")
+            yield (current_file, int(elem.get("beginline", 0)), elem.get("rule", ""),
+                   " ".join((elem.text or "").split()), fields)
+        elif tag == "file":
+            # violations are consumed; drop them so memory stays flat
+            root.clear()
+
+
+def iter_json_report(report_path: str):
+    """PMD's json renderer: files[].violations[] with beginline/endline/rule/description."""
+    for file_entry in iter_json_array(report_path, "files"):
+        for v in file_entry.get("violations", []):
+            fields = {}
+            if v.get("endline") is not None:
+                fields["end_line"] = int(v["endline"])
+            for key, field in (("package", "package"), ("class", "class_name"), ("method", "method")):
+                if v.get(key):
+                    fields[field] = v[key]
+            yield (file_entry.get("filename"), int(v.get("beginline", 0)), v.get("rule", ""),
+                   " ".join(v.get("description", "").split()), fields)
+
+
+def sarif_path(uri: str) -> str:
+    if uri.startswith("file:"):
+        return unquote(urlparse(uri).path)
+    return unquote(uri)
+
+
+def iter_sarif_report(report_path: str):
+    """SARIF 2.1 (PMD's sarif renderer): runs[].results[] with physicalLocation regions."""
+    for result in iter_json_array(report_path, "results"):
+        locations = result.get("locations") or [{}]
+        physical = locations[0].get("physicalLocation", {})
+        region = physical.get("region", {})
+        fields = {}
+        if region.get("endLine") is not None:
+            fields["end_line"] = int(region["endLine"])
+        yield (sarif_path(physical.get("artifactLocation", {}).get("uri", "")),
+               int(region.get("startLine", 0)), result.get("ruleId", ""),
+               " ".join(result.get("message", {}).get("text", "").split()), fields)
+
+
+REPORT_READERS = {
+    "text": iter_text_report,
+    "xml": iter_xml_report,
+    "json": iter_json_report,
+    "sarif": iter_sarif_report,
+}
 
-            package, class_name = extract_java_fqn(rel_path)
-
-            method_match = re.search(r"The method ['\"`]([^'\"`]+)['\"`] has", message)
-            if method_match:
-                raw_method = method_match.group(1)
-                method_name = normalise_method_name(raw_method)
-
-                m_args = re.match(r"([^(]+)\(([^)]*)\)", method_name)
-                if m_args:
-                    name_only, args_str = m_args.groups()
-                    args = [a.strip() for a in args_str.split(",") if a.strip()]
-                    fq_args = [qualify_argument(a, package) for a in args]
-                    method_name = f"{name_only}({','.join(fq_args)})"
-
-                fqn_method = f"{package}.{class_name}.{method_name}"
-
-                if fqn_method not in method_node_by_fqn:
-                    method_node = {"type": "Method", "fullName": fqn_method}
-                    method_node_by_fqn[fqn_method] = method_node
-                    nodes.append(method_node)
 
-                edges.append({
-                    "relationName": "HASISSUE",
-                    "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": fqn_method},
-                    "to": {"nodeType": "Issue", "propertyName": "id", "propertyValue": issue_id},
-                })
+def detect_report_format(report_path: str) -> str:
+    lower = report_path.lower()
+    if lower.endswith((".sarif", ".sarif.json")):
+        return "sarif"
+    with open(report_path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.read(4096).lstrip("\ufeff \t\r\n")
+    if head.startswith("<"):
+        return "xml"
+    if head.startswith("{"):
+        return "sarif" if re.search(r'"(?:runs|\$schema)"\s*:', head) and "sarif" in head.lower() else "json"
+    return "text"
+
+
+def parse_pmd_report(pmd_report_path: str, source_code_dir: str, report_format: str = "auto",
+                     writer=None):
+    if report_format == "auto":
+        report_format = detect_report_format(pmd_report_path)
+    graph = CyclomaticGraph(source_code_dir, writer)
+
+    for path, line_no, rule, message, fields in REPORT_READERS[report_format](pmd_report_path):
+        if not path:
+            continue
+        if report_format != "text":
+            path = relative_report_path(path, source_code_dir)
+        graph.add_issue(path, line_no, rule, message, **fields)
+
+    return graph.to_dict()
+
+
+# ---------------------------------------------------------------------------
+# Native engine: cyclomatic complexity straight from the Java AST
+# ---------------------------------------------------------------------------
+
+DEFAULT_RULESET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cyclomatic-ruleset.xml")
+
+
+def load_thresholds(ruleset_path: str):
+    """methodReportLevel/classReportLevel of the CyclomaticComplexity rule (PMD defaults: 10/80)."""
+    method_level, class_level = 10, 80
+    if not ruleset_path or not os.path.exists(ruleset_path):
+        return method_level, class_level
+    for rule in ET.parse(ruleset_path).getroot().iter():
+        if not rule.tag.endswith("rule") or "CyclomaticComplexity" not in rule.get("ref", ""):
+            continue
+        for prop in rule.iter():
+            if not prop.tag.endswith("property"):
                 continue
-
-            class_match = re.search(r"The class ['\"`]([^'\"`]+)['\"`] has", message)
-            if class_match:
-                fqn_class = f"{package}.{class_name}"
-                if fqn_class not in class_node_by_fqn:
-                    class_node = {"type": "Class", "fullName": fqn_class}
-                    class_node_by_fqn[fqn_class] = class_node
-                    nodes.append(class_node)
-
-                edges.append({
-                    "relationName": "HASISSUE",
-                    "from": {"nodeType": "Class", "propertyName": "fullName", "propertyValue": fqn_class},
-                    "to": {"nodeType": "Issue", "propertyName": "id", "propertyValue": issue_id},
-                })
+            if prop.get("name") == "methodReportLevel":
+                method_level = int(prop.get("value"))
+            elif prop.get("name") == "classReportLevel":
+                class_level = int(prop.get("value"))
+    return method_level, class_level
+
+
+def decision_points(root) -> int:
+    """
+    Decision points of one operation as PMD's CYCLO metric counts them:
+    if, while, do, for/foreach, every non-default case label, catch, ?:,
+    assert and each && / ||. Nested and anonymous class members are
+    operations of their own and are not descended into.
+    """
+    tree = javalang.tree
+    count = 0
+    stack = list(root.children)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+            continue
+        if not isinstance(item, javalang.ast.Node):
+            continue
+        if isinstance(item, (tree.MethodDeclaration, tree.ConstructorDeclaration,
+                             tree.ClassDeclaration, tree.InterfaceDeclaration,
+                             tree.EnumDeclaration)):
+            continue
+        if isinstance(item, (tree.IfStatement, tree.WhileStatement, tree.DoStatement,
+                             tree.ForStatement, tree.CatchClause, tree.TernaryExpression,
+                             tree.AssertStatement)):
+            count += 1
+        elif isinstance(item, tree.SwitchStatementCase):
+            count += len(item.case)
+        elif isinstance(item, tree.BinaryOperation) and item.operator in ("&&", "||"):
+            count += 1
+        stack.extend(item.children)
+    return count
+
+
+def operation_signature(operation) -> str:
+    params = [parameter_type(p) for p in operation.parameters]
+    return f"{operation.name}({', '.join(params)})"
+
+
+def analyze_java_file(path: str, source_code_dir: str, method_level: int, class_level: int):
+    """Worker: [(rel_path, line, rule, message)] for one file, in PMD's wording."""
+    try:
+        tree = javalang.parse.parse(read_source(path))
+    except Exception as e:
+        print(f"[WARN] Cannot parse {path}: {e}")
+        return []
+
+    rel_path = os.path.relpath(path, source_code_dir).replace(os.sep, "/")
+    rule = "CyclomaticComplexity"
+    issues = []
+    for _, type_decl in tree.filter(javalang.tree.ClassDeclaration):
+        class_issues = []
+        total = highest = 0
+        for member in type_decl.body or []:
+            if isinstance(member, javalang.tree.ConstructorDeclaration):
+                kind = "constructor"
+            elif isinstance(member, javalang.tree.MethodDeclaration) and member.body is not None:
+                kind = "method"
+            else:
                 continue
+            cyclo = 1 + decision_points(member)
+            total += cyclo
+            highest = max(highest, cyclo)
+            if cyclo >= method_level:
+                line = member.position.line if member.position else 0
+                class_issues.append((rel_path, line, rule,
+                                     f"The {kind} '{operation_signature(member)}' has a "
+                                     f"cyclomatic complexity of {cyclo}."))
+        if total >= class_level:
+            line = type_decl.position.line if type_decl.position else 0
+            issues.append((rel_path, line, rule,
+                           f"The class '{type_decl.name}' has a total cyclomatic "
+                           f"complexity of {total} (highest {highest})."))
+        issues.extend(class_issues)
+    return issues
+
+
+def analyze_sources(source_code_dir: str, method_level: int, class_level: int, jobs: int = 1,
+                    writer=None):
+    java_files = sorted(java_files_under(source_code_dir))
+    worker = partial(analyze_java_file, source_code_dir=source_code_dir,
+                     method_level=method_level, class_level=class_level)
+    if jobs <= 1 or len(java_files) <= 1:
+        per_file = map(worker, java_files)
+    else:
+        chunksize = max(1, len(java_files) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            per_file = list(pool.map(worker, java_files, chunksize=chunksize))
 
-            fqn_class = f"{package}.{class_name}"
-            if fqn_class not in class_node_by_fqn:
-                class_node = {"type": "Class", "fullName": fqn_class}
-                class_node_by_fqn[fqn_class] = class_node
-                nodes.append(class_node)
-
-            edges.append({
-                "relationName": "HASISSUE",
-                "from": {"nodeType": "Class", "propertyName": "fullName", "propertyValue": fqn_class},
-                "to": {"nodeType": "Issue", "propertyName": "id", "propertyValue": issue_id},
-            })
-
-    return {"nodes": nodes, "edges": edges}
+    graph = CyclomaticGraph(source_code_dir, writer)
+    for issues in per_file:
+        for issue in issues:
+            graph.add_issue(*issue)
+    return graph.to_dict()
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Parse PMD CyclomaticComplexity report and create a graph linking methods/classes to complexity issues."
     )
-    parser.add_argument("pmd_report", help="Path to the PMD text report file")
+    parser.add_argument("pmd_report", nargs="?", help="Path to the PMD report file: text, XML, JSON or SARIF (omit with --native)")
     parser.add_argument("source_dir", help="Root directory of the Java source code (needed to resolve packages)")
     parser.add_argument("-o", "--output", default="pmd_cyclomatic.json", help="Output JSON file (default: pmd_cyclomatic.json)")
-
-    args = parser.parse_args()
-
-    print(f"Parsing PMD report: {args.pmd_report}")
-    print(f"Source directory: {args.source_dir}")
-
-    graph = parse_pmd_report(args.pmd_report, args.source_dir)
-    result = {
-        "probeName": "Cyclomatic",
-        "nodes": graph["nodes"],
-        "edges": graph["edges"]
-    }
-
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
-
-    print(f"Done – {len(result['nodes'])} nodes, {len(result['edges'])} edges")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="auto",
+                        help="PMD report format: text, xml, json or sarif (default: auto-detect)")
+    parser.add_argument("--native", action="store_true",
+                        help="Compute cyclomatic complexity from the Java sources instead of reading a PMD report")
+    parser.add_argument("--ruleset", default=DEFAULT_RULESET,
+                        help="PMD ruleset whose CyclomaticComplexity thresholds --native applies "
+                             "(default: cyclomatic-ruleset.xml next to this script)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes for --native (default: 1)")
+    add_output_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.native and javalang is None:
+        parser.error("--native requires javalang (pip install javalang)")
+    if not args.native and not args.pmd_report:
+        parser.error("a PMD report is required unless --native is given")
+
+    with open_graph(args.output, "Cyclomatic", args) as writer:
+        if args.native:
+            method_level, class_level = load_thresholds(args.ruleset)
+            print(f"Analysing sources natively: {args.source_dir} "
+                  f"(method >= {method_level}, class >= {class_level})")
+            analyze_sources(args.source_dir, method_level, class_level, args.jobs, writer)
+        else:
+            print(f"Parsing PMD report: {args.pmd_report}")
+            print(f"Source directory: {args.source_dir}")
+            parse_pmd_report(args.pmd_report, args.source_dir, args.format, writer)
+
+    print(f"Done – {writer.node_count} nodes, {writer.edge_count} edges")
     print(f"Output written to: {args.output}")
 
 
@@ -1,135 +1,454 @@
 #!/usr/bin/env python3
 import os
-import json
+import sys
 import argparse
-import xmltodict
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
+from pom_resolver import DEFAULT_REPOSITORY, PomCache, PomResolver, discover_modules
 
-def extract_dependencies(pom_file_path):
-    with open(pom_file_path, 'r', encoding='utf-8') as file:
-        pom_xml = file.read()
-    pom_dict = xmltodict.parse(pom_xml)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probehub.graphwriter import add_output_arguments, open_graph
+from probehub.javasource import java_files_under, scan_header
 
-    deps_node = pom_dict['project'].get('dependencies', {})
-    dependencies = deps_node.get('dependency', []) if deps_node else []
 
-    if not isinstance(dependencies, list):
-        dependencies = [dependencies]
-
-    return [
-        {
-            'groupId': dep['groupId'],
-            'artifactId': dep['artifactId'],
-            'version': dep.get('version', 'UNKNOWN')
-        }
-        for dep in dependencies
-    ]
+def extract_dependencies(pom_file_path, resolver=None, transitive=False):
+    """
+    Dependencies of the project POM after parent inheritance, property
+    interpolation and dependencyManagement; with `transitive` also their
+    transitive closure from the local Maven repository (see pom_resolver).
+    """
+    resolver = resolver or PomResolver()
+    return resolver.resolve(pom_file_path, transitive=transitive)
 
 
-def analyze_source_code(source_directory):
+def analyze_source_code(source_directory, prefix='', threads=8, identifiers=False):
     class_to_dependencies = {}
     abs_source_directory = os.path.abspath(source_directory)
 
-    for root, _, files in os.walk(source_directory):
-        for file in files:
-            if file.endswith('.java'):
-                file_path = os.path.join(root, file)
-                abs_file_path = os.path.abspath(file_path)
-
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-
-                package_name = None
-                imports = set()
-
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('package '):
-                        package_name = line[8:-1]
-                    elif line.startswith('import '):
-                        import_name = line[7:-1]
-                        if not import_name.endswith(';'):
-                            continue
-                        imports.add(import_name[:-1] if import_name.endswith(';') else import_name)
-
-                if package_name:
-                    relative = os.path.relpath(abs_file_path, abs_source_directory)
-                    file_path_formatted = '/' + relative.replace(os.sep, '/')
-                    class_to_dependencies[file_path_formatted] = {"imports": imports}
+    java_files = list(java_files_under(source_directory))
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        headers = pool.map(partial(scan_header, body=identifiers), java_files)
+
+        for file_path, (package_name, imports, static_imports, names) in zip(java_files, headers):
+            if package_name:
+                relative = os.path.relpath(os.path.abspath(file_path), abs_source_directory)
+                file_path_formatted = prefix + '/' + relative.replace(os.sep, '/')
+                class_to_dependencies[file_path_formatted] = {
+                    "package": package_name,
+                    "imports": imports,
+                    "static": static_imports,
+                }
+                if identifiers:
+                    class_to_dependencies[file_path_formatted]["identifiers"] = names
 
     return class_to_dependencies
 
 
-def compare_dependencies(dependencies, class_to_dependencies):
-    nodes = []
-    edges = []
+class GroupIdTrie:
+    """
+    Character trie over the declared groupIds. Walking an import through it
+    yields every dependency whose groupId is a prefix of the import, in one
+    pass over the import's characters.
+    """
+
+    END = ""  # key of the dependency-index list on a node; never a real character
+
+    def __init__(self, dependencies):
+        self.root = {}
+        for index, dep in enumerate(dependencies):
+            node = self.root
+            for ch in dep['groupId']:
+                node = node.setdefault(ch, {})
+            node.setdefault(self.END, []).append(index)
+
+    def matches(self, name):
+        node = self.root
+        found = list(node.get(self.END, ()))
+        for ch in name:
+            node = node.get(ch)
+            if node is None:
+                break
+            found.extend(node.get(self.END, ()))
+        return found
 
+
+def dependency_items(dependencies, class_to_dependencies):
+    """("node", node) / ("edge", edge) pairs of the POM graph of one project, in output order."""
     # File nodes
     for file_path in class_to_dependencies:
-        nodes.append({
+        yield "node", {
             "fileName": file_path,
             "type": "File"
-        })
+        }
 
     # Library nodes
+    uids = []
     for dep in dependencies:
         uid = f"{dep['groupId']}:{dep['artifactId']}:{dep['version']}"
-        nodes.append({
+        uids.append(uid)
+        yield "node", {
             "type": "Library",
             "groupId": dep['groupId'],
             "artifactId": dep['artifactId'],
             "version": dep['version'],
-            "uid": uid
-        })
+            "uid": uid,
+            "scope": dep['scope'],
+            "depth": dep['depth']
+        }
+        if dep.get('via'):
+            yield "edge", {
+                "relationName": "REQUIRES",
+                "from": {
+                    "nodeType": "Library",
+                    "propertyName": "uid",
+                    "propertyValue": dep['via']
+                },
+                "to": {
+                    "nodeType": "Library",
+                    "propertyName": "uid",
+                    "propertyValue": uid
+                }
+            }
 
     # Edges: File → Library (if import starts with groupId)
+    trie = GroupIdTrie(dependencies)
+    for file_path, data in class_to_dependencies.items():
+        matched = set()
+        for imp in data["imports"]:
+            matched.update(trie.matches(imp))
+
+        # emit in declaration order, as the per-dependency scan did
+        for index in sorted(matched):
+            yield "edge", {
+                "relationName": "DEPENDS",
+                "from": {
+                    "nodeType": "File",
+                    "propertyName": "fileName",
+                    "propertyValue": file_path
+                },
+                "to": {
+                    "nodeType": "Library",
+                    "propertyName": "uid",
+                    "propertyValue": uids[index]
+                }
+            }
+
+
+class TypeIndex:
+    """
+    The project's own top-level types, one per file (named after the file):
+    fully qualified name -> fileName, and package -> {simple name -> fileName}.
+    """
+
+    def __init__(self, class_to_dependencies):
+        self.by_fqn = {}
+        self.by_package = {}
+        for file_path, data in class_to_dependencies.items():
+            simple = os.path.splitext(file_path.rsplit('/', 1)[-1])[0]
+            self.by_fqn[f"{data['package']}.{simple}"] = file_path
+            self.by_package.setdefault(data['package'], {})[simple] = file_path
+
+    def resolve_type(self, name):
+        """File of a type or of the type enclosing a nested type / static member."""
+        while name:
+            target = self.by_fqn.get(name)
+            if target:
+                return target
+            name = name.rpartition('.')[0]
+        return None
+
+    def references(self, data):
+        """Files of the project referenced by one file's imports and identifiers."""
+        targets = set()
+        names = data.get("identifiers") or ()
+        for imp in data["imports"]:
+            if imp.endswith('.*'):
+                base = imp[:-2]
+                if imp in data["static"]:
+                    targets.add(self.resolve_type(base))
+                else:
+                    # on-demand import: only the types the file actually names
+                    members = self.by_package.get(base, {})
+                    targets.update(members.get(n) for n in names)
+            else:
+                targets.add(self.resolve_type(imp))
+        # types of the same package need no import
+        peers = self.by_package.get(data["package"], {})
+        targets.update(peers.get(n) for n in names)
+        targets.discard(None)
+        return targets
+
+
+def strongly_connected_components(graph):
+    """Tarjan's algorithm, iterative so deep import chains don't hit the recursion limit."""
+    index, low, on_stack = {}, {}, set()
+    stack, components = [], []
+    counter = 0
+    for start in graph:
+        if start in index:
+            continue
+        work = [(start, iter(graph.get(start, ())))]
+        index[start] = low[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for succ in successors:
+                if succ not in index:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph.get(succ, ()))))
+                    advanced = True
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def internal_items(class_to_dependencies):
+    """
+    IMPORTS edges between the project's own files, and a PackageCycle node
+    per strongly connected component of the package import graph with more
+    than one package, linked from the files of its packages by INCYCLE edges.
+    """
+    index = TypeIndex(class_to_dependencies)
+    package_graph = {}
+
+    def file_ref(file_path):
+        return {"nodeType": "File", "propertyName": "fileName", "propertyValue": file_path}
+
     for file_path, data in class_to_dependencies.items():
-        file_imports = data["imports"]
+        package_graph.setdefault(data["package"], set())
+        for target in sorted(index.references(data)):
+            if target == file_path:
+                continue
+            yield "edge", {"relationName": "IMPORTS", "from": file_ref(file_path), "to": file_ref(target)}
+            target_package = class_to_dependencies[target]["package"]
+            if target_package != data["package"]:
+                package_graph[data["package"]].add(target_package)
+
+    cycles = sorted((sorted(c) for c in strongly_connected_components(package_graph) if len(c) > 1),
+                    key=lambda c: (-len(c), c))
+    cycle_of = {}
+    for n, packages in enumerate(cycles, 1):
+        cycle_id = f"cycle-{n}"
+        yield "node", {"type": "PackageCycle", "id": cycle_id, "packages": packages, "size": len(packages)}
+        cycle_of.update((pkg, cycle_id) for pkg in packages)
+
+    for file_path, data in class_to_dependencies.items():
+        cycle_id = cycle_of.get(data["package"])
+        if cycle_id:
+            yield "edge", {
+                "relationName": "INCYCLE",
+                "from": file_ref(file_path),
+                "to": {"nodeType": "PackageCycle", "propertyName": "id", "propertyValue": cycle_id},
+            }
+
+
+def scan_module(target):
+    """Worker: analyze_source_code for one reactor module's source tree."""
+    source_directory, prefix, threads, identifiers = target
+    return analyze_source_code(source_directory, prefix, threads, identifiers)
+
+
+def analyze_reactor(root_pom, resolver, transitive=False, jobs=1, threads=8, identifiers=False):
+    """
+    Resolves every module of the reactor rooted at root_pom with one shared
+    resolver, so parent and repository POMs are parsed once, and scans the
+    module source trees in `jobs` worker processes.
+    Returns [(module_model, dependencies, class_to_dependencies)].
+    """
+    modules = discover_modules(root_pom, resolver)
+    root_dir = os.path.dirname(os.path.abspath(root_pom))
+    module_deps = [resolver.resolve(m["path"], transitive=transitive) for m in modules]
+
+    # File names are made relative to the reactor root so they stay unique
+    targets = [(m["sourceDirectory"],
+                '/' + os.path.relpath(m["sourceDirectory"], root_dir).replace(os.sep, '/'),
+                threads, identifiers)
+               for m in modules]
+    scanned = [i for i, (src, *_) in enumerate(targets) if os.path.isdir(src)]
+    if jobs <= 1 or len(scanned) <= 1:
+        results = [scan_module(targets[i]) for i in scanned]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(scan_module, [targets[i] for i in scanned]))
+    module_files = [{} for _ in modules]
+    for i, files in zip(scanned, results):
+        module_files[i] = files
+
+    return list(zip(modules, module_deps, module_files))
+
+
+def reactor_items(reactor):
+    """
+    ("node", node) / ("edge", edge) pairs of one POM graph over all modules:
+    Module nodes, CONTAINS edges to their files, DECLARES edges to their
+    declared libraries and DEPENDS_ON edges between modules. Files are
+    matched only against their own module's dependencies; Library nodes
+    shared by several modules are left to the writer's deduplication.
+    """
+    module_uids = {(m["groupId"], m["artifactId"]): f"{m['groupId']}:{m['artifactId']}:{m['version']}"
+                   for m, _, _ in reactor}
+    modules = set(module_uids.values())
+    seen_edges = set()
+
+    def new_edge(edge):
+        key = (edge["relationName"], edge["from"]["nodeType"], edge["from"]["propertyValue"],
+               edge["to"]["nodeType"], edge["to"]["propertyValue"])
+        if key in seen_edges:
+            return False
+        seen_edges.add(key)
+        return True
+
+    def link(relation, from_type, from_uid, to_type, to_key, to_value, **props):
+        edge = {
+            "relationName": relation,
+            "from": {"nodeType": from_type, "propertyName": "uid", "propertyValue": from_uid},
+            "to": {"nodeType": to_type, "propertyName": to_key, "propertyValue": to_value},
+        }
+        edge.update(props)
+        return edge
+
+    for model, dependencies, files in reactor:
+        uid = module_uids[(model["groupId"], model["artifactId"])]
+        yield "node", {
+            "type": "Module",
+            "uid": uid,
+            "groupId": model["groupId"],
+            "artifactId": model["artifactId"],
+            "version": model["version"],
+            "packaging": model["packaging"],
+        }
+
+        libraries = []
         for dep in dependencies:
-            group_id = dep['groupId']
-            uid = f"{dep['groupId']}:{dep['artifactId']}:{dep['version']}"
-
-            if any(imp.startswith(group_id) for imp in file_imports):
-                edges.append({
-                    "relationName": "DEPENDS",
-                    "from": {
-                        "nodeType": "File",
-                        "propertyName": "fileName",
-                        "propertyValue": file_path
-                    },
-                    "to": {
-                        "nodeType": "Library",
-                        "propertyName": "uid",
-                        "propertyValue": uid
-                    }
-                })
-
-    return {"probeName": "POM", "nodes": nodes, "edges": edges}
-
-
-def main():
+            sibling = module_uids.get((dep["groupId"], dep["artifactId"]))
+            if sibling:
+                edge = link("DEPENDS_ON", "Module", uid, "Module", "uid", sibling, scope=dep["scope"])
+            else:
+                libraries.append(dep)
+                edge = link("DECLARES", "Module", uid, "Library", "uid", dep["uid"], scope=dep["scope"])
+            if dep["depth"] == 1 and new_edge(edge):
+                yield "edge", edge
+
+        for kind, item in dependency_items(libraries, files):
+            if kind == "edge":
+                if item["relationName"] == "REQUIRES" and item["from"]["propertyValue"] in modules:
+                    item["from"]["nodeType"] = "Module"
+                if not new_edge(item):
+                    continue
+            yield kind, item
+        for file_path in files:
+            edge = link("CONTAINS", "Module", uid, "File", "fileName", file_path)
+            if new_edge(edge):
+                yield "edge", edge
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Analyze Maven (pom.xml) dependencies and map them to actual imports in Java source code."
     )
-    parser.add_argument("pom", help="Path to the pom.xml file")
-    parser.add_argument("source", help="Root directory containing Java source files (e.g. src/main/java or project root)")
+    parser.add_argument("pom", help="Path to the pom.xml file (the root pom.xml with --reactor)")
+    parser.add_argument("source", nargs="?",
+                        help="Root directory containing Java source files (e.g. src/main/java or project root); "
+                             "not used with --reactor")
     parser.add_argument("-o", "--output", default="dependencies.json",
                         help="Output JSON file path (default: dependencies.json)")
+    parser.add_argument("--transitive", action="store_true",
+                        help="Also resolve transitive dependencies from the local Maven repository")
+    parser.add_argument("--m2-repo", default=DEFAULT_REPOSITORY,
+                        help="Local Maven repository (default: ~/.m2/repository)")
+    parser.add_argument("--cache-dir",
+                        default=os.path.join(os.path.expanduser("~"), ".cache", "probe-hub"),
+                        help="Directory of the parsed-POM cache (default: ~/.cache/probe-hub)")
+    parser.add_argument("--no-pom-cache", action="store_true",
+                        help="Parse every POM again instead of using the cache")
+    parser.add_argument("--reactor", action="store_true",
+                        help="Analyze every module listed under <modules> of the root pom.xml")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes scanning module sources with --reactor (default: 1)")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Threads reading Java file headers per source tree (default: 8)")
+    parser.add_argument("--internal", action="store_true",
+                        help="Also link the project's own files by IMPORTS edges and report "
+                             "cyclic package clusters (reads whole files)")
+    add_output_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if not args.reactor and not args.source:
+        parser.error("a source directory is required unless --reactor is given")
 
     print(f"Reading pom.xml: {args.pom}")
-    print(f"Scanning sources: {args.source}")
+    if not args.reactor:
+        print(f"Scanning sources: {args.source}")
+
+    cache = None if args.no_pom_cache else PomCache(os.path.join(args.cache_dir, "pom-cache.sqlite"))
+    resolver = PomResolver(args.m2_repo, cache)
+    try:
+        if args.reactor:
+            reactor = analyze_reactor(args.pom, resolver, args.transitive, args.jobs, args.threads,
+                                      args.internal)
+        else:
+            dependencies = extract_dependencies(args.pom, resolver, args.transitive)
+    finally:
+        if cache:
+            cache.close()
+            print(f"POM cache: {cache.hits} hits, {cache.misses} misses")
+    if resolver.missing:
+        print(f"[WARN] {len(resolver.missing)} POMs not found in {args.m2_repo}: "
+              f"{', '.join(sorted(resolver.missing)[:5])}{' ...' if len(resolver.missing) > 5 else ''}")
 
-    dependencies = extract_dependencies(args.pom)
-    class_to_deps = analyze_source_code(args.source)
-    result = compare_dependencies(dependencies, class_to_deps)
+    if args.reactor:
+        items = reactor_items(reactor)
+        print(f"Modules: {len(reactor)}")
+        if args.internal:
+            class_to_deps = {}
+            for _, _, files in reactor:
+                class_to_deps.update(files)
+    else:
+        class_to_deps = analyze_source_code(args.source, threads=args.threads, identifiers=args.internal)
+        items = dependency_items(dependencies, class_to_deps)
+    if args.internal:
+        items = itertools.chain(items, internal_items(class_to_deps))
 
-    with open(args.output, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=4)
+    counts = Counter()
+    with open_graph(args.output, "POM", args) as writer:
+        for kind, item in items:
+            if kind == "node":
+                if writer.add_node(item):
+                    counts[item["type"]] += 1
+            else:
+                writer.add_edge(item)
+                counts[item["relationName"]] += 1
+    if args.internal:
+        print(f"   Internal imports: {counts['IMPORTS']} | Package cycles: {counts['PackageCycle']}")
 
-    print(f"Success! Graph saved to {args.output}")
-    print(f"   Files: {len(class_to_deps)} | Libraries: {len(dependencies)} | Dependencies: {len(result['edges'])}")
+    print(f"Success! Graph saved to {args.output} ({writer.node_count} nodes, {writer.edge_count} edges)")
+    print(f"   Files: {counts['File']} | Libraries: {counts['Library']} | Dependencies: {counts['DEPENDS']}")
 
 
 if __name__ == '__main__':
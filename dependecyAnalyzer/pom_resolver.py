@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Offline Maven model building for dependency-analyzer.py.
+
+POMs are read from the project tree and from the local repository
+(~/.m2/repository); nothing is downloaded. A POM's effective model follows
+Maven's rules closely enough for dependency analysis:
+
+    parent inheritance    via <relativePath> (default ../pom.xml), then the
+                          local repository
+    properties            inherited and overridden, ${project.*}, ${pom.*},
+                          ${project.parent.*} and ${env.*}, interpolated after
+                          inheritance so a child can override a parent's
+                          version property
+    dependencies          inherited, a child's declaration replacing its
+                          parent's for the same groupId:artifactId:type
+    dependencyManagement  inherited, plus <scope>import</scope> BOMs
+    transitive closure    breadth first, nearest declaration wins, with
+                          scope mediation, exclusions and optional
+                          dependencies skipped
+
+Parsed POMs are memoized in memory for the run and in an SQLite cache keyed
+by path, size and mtime, so the thousands of POMs shared between services
+are only parsed once.
+"""
+import json
+import os
+import re
+import sqlite3
+from collections import deque
+
+import xmltodict
+
+CACHE_VERSION = "2"
+DEFAULT_REPOSITORY = os.path.join(os.path.expanduser("~"), ".m2", "repository")
+PROPERTY_RE = re.compile(r"\$\{([^}]+)\}")
+VERSION_PART_RE = re.compile(r"\d+|[A-Za-z]+")
+
+# Scope of a transitive dependency given the scope of the dependency that
+# pulled it in (outer key) and its own declared scope (inner key). Anything
+# missing, e.g. provided or test dependencies of a library, is not transitive.
+SCOPE_TRANSITIONS = {
+    "compile": {"compile": "compile", "runtime": "runtime"},
+    "provided": {"compile": "provided", "runtime": "provided"},
+    "runtime": {"compile": "runtime", "runtime": "runtime"},
+    "test": {"compile": "test", "runtime": "test"},
+}
+
+
+def as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def text(value):
+    if isinstance(value, dict):
+        value = value.get("#text")
+    return value.strip() if isinstance(value, str) else None
+
+
+def read_dependency(dep):
+    exclusions = (dep.get("exclusions") or {}).get("exclusion")
+    return {
+        "groupId": text(dep.get("groupId")),
+        "artifactId": text(dep.get("artifactId")),
+        "version": text(dep.get("version")),
+        "scope": text(dep.get("scope")),
+        "type": text(dep.get("type")),
+        "classifier": text(dep.get("classifier")),
+        "optional": text(dep.get("optional")) == "true",
+        "exclusions": [[text(e.get("groupId")), text(e.get("artifactId"))]
+                       for e in as_list(exclusions) if isinstance(e, dict)],
+    }
+
+
+def read_pom(path):
+    """The parts of one pom.xml the analyzer needs, uninterpolated and JSON-serialisable."""
+    with open(path, "rb") as f:
+        project = xmltodict.parse(f).get("project") or {}
+
+    parent = project.get("parent")
+    if isinstance(parent, dict):
+        relative = parent.get("relativePath", "../pom.xml")
+        parent = {
+            "groupId": text(parent.get("groupId")),
+            "artifactId": text(parent.get("artifactId")),
+            "version": text(parent.get("version")),
+            "relativePath": text(relative) or "",
+        }
+    else:
+        parent = None
+
+    properties = project.get("properties")
+    management = (project.get("dependencyManagement") or {}).get("dependencies") or {}
+    dependencies = project.get("dependencies") or {}
+    modules = (project.get("modules") or {}).get("module")
+    return {
+        "groupId": text(project.get("groupId")),
+        "artifactId": text(project.get("artifactId")),
+        "version": text(project.get("version")),
+        "packaging": text(project.get("packaging")) or "jar",
+        "parent": parent,
+        "properties": {key: text(value) or ""
+                       for key, value in (properties.items() if isinstance(properties, dict) else ())
+                       if not key.startswith(("@", "#"))},
+        "managed": [read_dependency(d) for d in as_list(management.get("dependency"))
+                    if isinstance(d, dict)],
+        "dependencies": [read_dependency(d) for d in as_list(dependencies.get("dependency"))
+                         if isinstance(d, dict)],
+        "modules": [text(m) for m in as_list(modules) if text(m)],
+        "sourceDirectory": text((project.get("build") or {}).get("sourceDirectory")),
+    }
+
+
+def management_key(dep):
+    return (dep["groupId"], dep["artifactId"], dep.get("type") or "jar", dep.get("classifier") or "")
+
+
+def version_key(version):
+    return [(0, int(p), "") if p.isdigit() else (1, 0, p.lower())
+            for p in VERSION_PART_RE.findall(version)]
+
+
+class PomCache:
+    """
+    On-disk table of read_pom results keyed by absolute path. An entry is
+    reused only while the file's size and mtime are unchanged, and the table
+    is dropped when CACHE_VERSION changes.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS poms (
+                path     TEXT PRIMARY KEY,
+                size     INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                data     TEXT NOT NULL
+            );
+        """)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != CACHE_VERSION:
+            with self.conn:
+                self.conn.execute("DELETE FROM poms")
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                                  (CACHE_VERSION,))
+        self.hits = self.misses = 0
+
+    def get(self, path, stat):
+        row = self.conn.execute(
+            "SELECT data FROM poms WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, path, stat, pom):
+        self.conn.execute("INSERT OR REPLACE INTO poms VALUES (?, ?, ?, ?)",
+                          (path, stat.st_size, stat.st_mtime_ns, json.dumps(pom)))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class PomResolver:
+    def __init__(self, repository=DEFAULT_REPOSITORY, cache=None):
+        self.repository = repository
+        self.cache = cache
+        self._raw = {}
+        self._inherited = {}
+        self._models = {}
+        self.missing = set()
+        # (groupId, artifactId) -> pom.xml of projects built in the same
+        # reactor; they shadow the local repository
+        self.workspace = {}
+
+    def artifact_pom(self, group_id, artifact_id, version):
+        return self.workspace.get((group_id, artifact_id)) or \
+            self.repository_pom(group_id, artifact_id, version)
+
+    def repository_pom(self, group_id, artifact_id, version):
+        version = self.pick_version(group_id, artifact_id, version)
+        return os.path.join(self.repository, *group_id.split("."), artifact_id,
+                            version, f"{artifact_id}-{version}.pom")
+
+    def pick_version(self, group_id, artifact_id, version):
+        """Version ranges resolve to the highest version installed locally."""
+        if not version or version[0] not in "[(":
+            return version
+        try:
+            installed = os.listdir(os.path.join(self.repository, *group_id.split("."), artifact_id))
+        except OSError:
+            return version
+        return max(installed, key=version_key) if installed else version
+
+    def raw(self, path):
+        path = os.path.abspath(path)
+        if path in self._raw:
+            return self._raw[path]
+        pom = None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if stat is not None:
+            pom = self.cache.get(path, stat) if self.cache else None
+            if pom is None:
+                try:
+                    pom = read_pom(path)
+                except Exception as e:
+                    print(f"[WARN] Cannot parse {path}: {e}")
+                else:
+                    if self.cache:
+                        self.cache.put(path, stat, pom)
+        self._raw[path] = pom
+        return pom
+
+    def parent_path(self, path, parent):
+        if parent["relativePath"]:
+            candidate = os.path.normpath(os.path.join(os.path.dirname(path), parent["relativePath"]))
+            if os.path.isdir(candidate):
+                candidate = os.path.join(candidate, "pom.xml")
+            raw = self.raw(candidate)
+            if raw and raw["artifactId"] == parent["artifactId"] and \
+                    (raw["groupId"] or (raw["parent"] or {}).get("groupId")) == parent["groupId"]:
+                return os.path.abspath(candidate)
+        if parent["groupId"] and parent["artifactId"] and parent["version"]:
+            candidate = self.repository_pom(parent["groupId"], parent["artifactId"], parent["version"])
+            if self.raw(candidate):
+                return candidate
+        return None
+
+    def inherited(self, path):
+        """The POM merged with its parents, still uninterpolated."""
+        path = os.path.abspath(path)
+        if path in self._inherited:
+            return self._inherited[path]
+        self._inherited[path] = None  # guards against parent cycles
+        raw = self.raw(path)
+        if raw is None:
+            return None
+
+        base = None
+        if raw["parent"]:
+            parent_path = self.parent_path(path, raw["parent"])
+            base = self.inherited(parent_path) if parent_path else None
+            if base is None:
+                p = raw["parent"]
+                self.missing.add(f"{p['groupId']}:{p['artifactId']}:{p['version']}")
+
+        parent = raw["parent"] or {}
+        merged = {
+            "path": path,
+            "groupId": raw["groupId"] or parent.get("groupId"),
+            "artifactId": raw["artifactId"],
+            "version": raw["version"] or parent.get("version"),
+            "packaging": raw["packaging"],
+            "parent": raw["parent"],
+            "properties": dict(base["properties"]) if base else {},
+            "managed": {},
+            "dependencies": dict(base["dependencies"]) if base else {},
+            "modules": raw["modules"],
+            "sourceDirectory": raw["sourceDirectory"] or (base["sourceDirectory"] if base else None),
+        }
+        merged["properties"].update(raw["properties"])
+        if base:
+            merged["managed"].update(base["managed"])
+        for dep in raw["managed"]:
+            merged["managed"][management_key(dep)] = dep
+        # a child's redeclaration replaces the parent's, as in Maven's merge
+        for dep in raw["dependencies"]:
+            merged["dependencies"][management_key(dep)] = dep
+        self._inherited[path] = merged
+        return merged
+
+    def model(self, path):
+        """Effective, interpolated model of one POM, or None when it cannot be read."""
+        path = os.path.abspath(path)
+        if path in self._models:
+            return self._models[path]
+        self._models[path] = None
+        merged = self.inherited(path)
+        if merged is None:
+            return None
+
+        props = dict(merged["properties"])
+        parent = merged["parent"] or {}
+        for prefix in ("project.", "pom."):
+            props.setdefault(prefix + "groupId", merged["groupId"] or "")
+            props.setdefault(prefix + "artifactId", merged["artifactId"] or "")
+            props.setdefault(prefix + "version", merged["version"] or "")
+            props.setdefault(prefix + "packaging", merged["packaging"])
+            props.setdefault(prefix + "parent.groupId", parent.get("groupId") or "")
+            props.setdefault(prefix + "parent.version", parent.get("version") or "")
+        props.setdefault("project.basedir", os.path.dirname(path))
+        props.setdefault("basedir", os.path.dirname(path))
+
+        def resolve(dep):
+            dep = dict(dep)
+            for field in ("groupId", "artifactId", "version", "scope", "type", "classifier"):
+                dep[field] = interpolate(dep[field], props)
+            return dep
+
+        managed = {}
+        for dep in map(resolve, merged["managed"].values()):
+            if dep["scope"] == "import" and (dep["type"] or "jar") == "pom":
+                bom = self.model(self.artifact_pom(dep["groupId"], dep["artifactId"], dep["version"] or ""))
+                if bom is None:
+                    self.missing.add(f"{dep['groupId']}:{dep['artifactId']}:{dep['version']}")
+                    continue
+                for key, bom_dep in bom["managed"].items():
+                    managed.setdefault(key, bom_dep)
+            else:
+                managed[management_key(dep)] = dep
+
+        dependencies = []
+        for dep in map(resolve, merged["dependencies"].values()):
+            rule = managed.get(management_key(dep))
+            if rule:
+                dep["version"] = dep["version"] or rule["version"]
+                dep["scope"] = dep["scope"] or rule["scope"]
+                dep["exclusions"] = dep["exclusions"] + rule["exclusions"]
+            dependencies.append(dep)
+
+        model = {
+            "path": path,
+            "groupId": interpolate(merged["groupId"], props),
+            "artifactId": interpolate(merged["artifactId"], props),
+            "version": interpolate(merged["version"], props),
+            "packaging": merged["packaging"],
+            "properties": props,
+            "managed": managed,
+            "dependencies": dependencies,
+            "modules": merged["modules"],
+            "sourceDirectory": os.path.join(os.path.dirname(path), interpolate(
+                merged["sourceDirectory"] or os.path.join("src", "main", "java"), props)),
+        }
+        self._models[path] = model
+        return model
+
+    def resolve(self, pom_path, transitive=True):
+        """
+        Dependencies of a project POM as dicts with groupId, artifactId,
+        version, scope, depth (1 = declared) and via (uid of the dependency
+        that pulled it in). Declared dependencies come first, transitive ones
+        follow in breadth-first order; for each groupId:artifactId the
+        nearest declaration wins, and the project's dependencyManagement
+        pins transitive versions.
+        """
+        root = self.model(pom_path)
+        if root is None:
+            raise FileNotFoundError(pom_path)
+
+        resolved, seen = [], set()
+        queue = deque()
+        for dep in root["dependencies"]:
+            key = (dep["groupId"], dep["artifactId"])
+            if key in seen:
+                continue
+            seen.add(key)
+            dep = dict(dep, version=self.pick_version(dep["groupId"], dep["artifactId"], dep["version"]))
+            entry = self._entry(dep, dep["version"], dep["scope"] or "compile", 1, None)
+            resolved.append(entry)
+            queue.append((entry, dep, {tuple(e) for e in dep["exclusions"]}))
+
+        while transitive and queue:
+            entry, dep, excluded = queue.popleft()
+            if dep["version"] is None or (dep["type"] or "jar") == "pom" and dep["scope"] == "import":
+                continue
+            model = self.model(self.artifact_pom(dep["groupId"], dep["artifactId"], dep["version"]))
+            if model is None:
+                self.missing.add(entry["uid"])
+                continue
+            for child in model["dependencies"]:
+                scope = SCOPE_TRANSITIONS.get(entry["scope"], {}).get(child["scope"] or "compile")
+                key = (child["groupId"], child["artifactId"])
+                if scope is None or child["optional"] or key in seen or is_excluded(key, excluded):
+                    continue
+                seen.add(key)
+                rule = root["managed"].get(management_key(child))
+                version = (rule and rule["version"]) or child["version"]
+                child = dict(child, version=self.pick_version(child["groupId"], child["artifactId"], version))
+                child_entry = self._entry(child, child["version"], scope, entry["depth"] + 1, entry["uid"])
+                resolved.append(child_entry)
+                queue.append((child_entry, child, excluded | {tuple(e) for e in child["exclusions"]}))
+        return resolved
+
+    @staticmethod
+    def _entry(dep, version, scope, depth, via):
+        version = version or "UNKNOWN"
+        return {
+            "groupId": dep["groupId"],
+            "artifactId": dep["artifactId"],
+            "version": version,
+            "scope": scope,
+            "depth": depth,
+            "via": via,
+            "uid": f"{dep['groupId']}:{dep['artifactId']}:{version}",
+        }
+
+
+def discover_modules(root_pom, resolver):
+    """
+    Effective models of every project in the reactor of root_pom: the root
+    first, then its <modules> depth first in declaration order. All of them
+    are registered as workspace artifacts of the resolver.
+    """
+    models, seen = [], set()
+
+    def visit(pom_path):
+        pom_path = os.path.abspath(pom_path)
+        if pom_path in seen:
+            return
+        seen.add(pom_path)
+        model = resolver.model(pom_path)
+        if model is None:
+            print(f"[WARN] Cannot read module POM {pom_path}")
+            return
+        models.append(model)
+        resolver.workspace[(model["groupId"], model["artifactId"])] = pom_path
+        for module in model["modules"]:
+            module_path = os.path.join(os.path.dirname(pom_path), module)
+            if os.path.isdir(module_path):
+                module_path = os.path.join(module_path, "pom.xml")
+            visit(module_path)
+
+    visit(root_pom)
+    return models
+
+
+def is_excluded(key, exclusions):
+    group_id, artifact_id = key
+    return any((g in (group_id, "*")) and (a in (artifact_id, "*")) for g, a in exclusions)
+
+
+def interpolate(value, props, depth=0):
+    if not value or "$" not in value or depth > 10:
+        return value
+
+    def replace(m):
+        name = m.group(1)
+        if name in props:
+            return interpolate(props[name], props, depth + 1)
+        if name.startswith("env."):
+            return os.environ.get(name[4:], m.group(0))
+        return m.group(0)
+
+    return PROPERTY_RE.sub(replace, value)
@@ -1,162 +1,499 @@
 #!/usr/bin/env python3
 import csv
-import json
 import argparse
+import glob
+import os
 import re
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probehub.graphwriter import add_output_arguments, open_graph
+from probehub.resolver import SymbolTable, TypeResolver
 
 
 def is_method(name):
     return '(' in name and name.endswith(')')
 
 
-PRIMITIVE_TYPES = {
-    'int', 'boolean', 'long', 'double', 'float', 'short', 'byte', 'char'
-}
+class MethodTable:
+    """
+    Interns profiler method names as integer ids.
+
+    Qualification is memoized per raw profiler name, so each distinct name
+    goes through the shared TypeResolver once however many rows mention it,
+    and raw names that qualify to the same method share one id. Memory is
+    proportional to the number of distinct methods, not rows.
+    """
+
+    def __init__(self, prefix, resolver=None):
+        self.prefix = prefix
+        self.resolver = resolver or TypeResolver()
+        self.names = []         # id -> qualified name
+        self.in_scope = []      # id -> qualified name starts with prefix
+        self._ids = {}          # qualified name -> id
+        self._raw = {}          # raw name -> id, or None if not a method
+
+    def intern(self, raw_name):
+        """Return the id for a stripped profiler name, or None if it is not a method."""
+        try:
+            return self._raw[raw_name]
+        except KeyError:
+            pass
+        mid = None
+        if raw_name != "Self time" and is_method(raw_name):
+            name = self.resolver.qualify_signature(raw_name)
+            if is_method(name):
+                mid = self.add(name)
+        self._raw[raw_name] = mid
+        return mid
+
+    def add(self, name):
+        """Return the id for an already qualified method name."""
+        mid = self._ids.get(name)
+        if mid is None:
+            mid = len(self.names)
+            self._ids[name] = mid
+            self.names.append(name)
+            self.in_scope.append(name.startswith(self.prefix))
+        return mid
+
+
+def iter_call_edges(rows, table):
+    """
+    Stream (caller_id, callee_id, row) triples out of indented call-tree rows.
+    Only the current call path is kept, as parallel lists of ints.
+    """
+    levels = []
+    ids = []
+    in_scope = table.in_scope
+    for row in rows:
+        if not row:
+            continue
+        name_with_space = row[0]
+        stripped = name_with_space.lstrip(' ')
+        # usually 2 spaces per level in profilers
+        level = (len(name_with_space) - len(stripped)) // 2
+        mid = table.intern(stripped.rstrip())
+        if mid is None:
+            continue
+
+        # Pop stack until parent level
+        while levels and levels[-1] >= level:
+            levels.pop()
+            ids.pop()
+
+        if ids and in_scope[mid]:
+            yield ids[-1], mid, row
+
+        levels.append(level)
+        ids.append(mid)
+
+
+NUMBER_RE = re.compile(r'-?[0-9]+(?:\.[0-9]+)?')
+
+
+def parse_number(value):
+    """Profiler cells look like '1250', '1,250' or '1,250 ms'."""
+    value = value.replace(',', '')
+    try:
+        return float(value)
+    except ValueError:
+        match = NUMBER_RE.search(value)
+        return float(match.group(0)) if match else 0.0
+
+
+def detect_columns(header):
+    """
+    Locate the total time, self time and invocation columns by header name,
+    falling back to the usual Name, Time, Self Time, Invocations layout.
+    """
+    total_col = self_col = count_col = None
+    for i, title in enumerate(header[1:], start=1):
+        title = title.strip().lower()
+        if "self" in title and self_col is None:
+            self_col = i
+        elif ("invocation" in title or "count" in title or "calls" in title) \
+                and count_col is None:
+            count_col = i
+        elif "time" in title and total_col is None:
+            total_col = i
+    if total_col is None and self_col is None and count_col is None \
+            and len(header) >= 4:
+        total_col, self_col, count_col = 1, 2, 3
+    return total_col, self_col, count_col
+
+
+class EdgeStore:
+    """
+    Aggregated DCALL weights. Every distinct (caller, callee) pair gets a
+    slot and its weights live in flat typed arrays indexed by that slot,
+    so repeated call paths are summed in place.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self.callers = array('q')
+        self.callees = array('q')
+        self.invocations = array('q')
+        self.total_time = array('d')
+        self.self_time = array('d')
+
+    def __len__(self):
+        return len(self.callers)
+
+    def add(self, caller, callee, invocations=0, total_time=0.0, self_time=0.0):
+        key = (caller << 32) | callee
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self.callers)
+            self._slots[key] = slot
+            self.callers.append(caller)
+            self.callees.append(callee)
+            self.invocations.append(invocations)
+            self.total_time.append(total_time)
+            self.self_time.append(self_time)
+        else:
+            self.invocations[slot] += invocations
+            self.total_time[slot] += total_time
+            self.self_time[slot] += self_time
+
+    def merge(self, other, id_map):
+        """Sum another store in, translating its method ids through id_map."""
+        for slot in range(len(other)):
+            self.add(id_map[other.callers[slot]], id_map[other.callees[slot]],
+                     other.invocations[slot], other.total_time[slot],
+                     other.self_time[slot])
+
+    def __getstate__(self):
+        # The slot index is rebuilt on unpickling instead of being shipped
+        state = self.__dict__.copy()
+        del state["_slots"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._slots = {(c << 32) | e: slot
+                       for slot, (c, e) in enumerate(zip(self.callers, self.callees))}
+
+
+def ingest_call_tree_csv(path, table, store):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, quotechar='"', delimiter=',', skipinitialspace=True)
+        header = next(reader, None) or []
+        total_col, self_col, count_col = detect_columns(header)
+
+        def cell(row, col):
+            return parse_number(row[col]) if col is not None and col < len(row) else 0.0
+
+        for caller, callee, row in iter_call_edges(reader, table):
+            store.add(caller, callee, int(cell(row, count_col)),
+                      cell(row, total_col), cell(row, self_col))
+
+
+def ingest_snapshot(path, prefix, fmt="auto", sample_interval=1.0, resolver=None):
+    """Worker: ingest one profiler export into its own table and store."""
+    table = MethodTable(prefix, resolver)
+    store = EdgeStore()
+    ingest_file(path, table, store, fmt, sample_interval)
+    return table.names, store
+
+
+def ingest_snapshots(paths, table, store, jobs=1, fmt="auto", sample_interval=1.0):
+    """
+    Ingest many profiler exports, in worker processes when jobs > 1, and
+    reduce the partial graphs into `table` and `store`. Partials are merged
+    in input order, so the sums do not depend on worker scheduling.
+    """
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            ingest_file(path, table, store, fmt, sample_interval)
+        return
+    worker = partial(ingest_snapshot, prefix=table.prefix, fmt=fmt,
+                     sample_interval=sample_interval, resolver=table.resolver)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for path, (names, partial_store) in zip(paths, pool.map(worker, paths)):
+            id_map = [table.add(name) for name in names]
+            store.merge(partial_store, id_map)
+            print(f"   Merged {path}: {len(partial_store)} calls")
+
 
-TYPE_MAPPING = {
-    'Integer': 'java.lang.Integer',
-    'String': 'java.lang.String',
-    'Object': 'java.lang.Object',
-    'Boolean': 'java.lang.Boolean',
-    'Long': 'java.lang.Long',
-    'Double': 'java.lang.Double',
-    'Float': 'java.lang.Float',
-    'Short': 'java.lang.Short',
-    'Byte': 'java.lang.Byte',
-    'Character': 'java.lang.Character',
-    'List': 'java.util.List',
-    'Map': 'java.util.Map',
-    'Set': 'java.util.Set',
-    'Collection': 'java.util.Collection',
-    'Locale': 'java.util.Locale',
-    'Errors': 'org.springframework.validation.Errors',
-    'Model': 'org.springframework.ui.Model',
-    'Page': 'org.springframework.data.domain.Page'
+def expand_inputs(patterns):
+    """Expand glob patterns (for shells that do not) into a sorted file list."""
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(pattern)
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return paths
+
+
+DESCRIPTOR_TYPES = {
+    'Z': 'boolean', 'B': 'byte', 'C': 'char', 'S': 'short',
+    'I': 'int', 'J': 'long', 'F': 'float', 'D': 'double'
 }
+FRAME_SUFFIX_RE = re.compile(r'_\[([a-z0-9])\]$')
+
+
+def descriptor_params(descriptor):
+    """'I[Ljava/lang/String;' -> ['int', 'java.lang.String[]']"""
+    params = []
+    i = 0
+    while i < len(descriptor):
+        dims = 0
+        while descriptor[i] == '[':
+            dims += 1
+            i += 1
+        if descriptor[i] == 'L':
+            end = descriptor.index(';', i)
+            name = descriptor[i + 1:end].replace('/', '.')
+            i = end + 1
+        else:
+            name = DESCRIPTOR_TYPES.get(descriptor[i], descriptor[i])
+            i += 1
+        params.append(name + '[]' * dims)
+    return params
+
 
+def normalise_frame(frame):
+    """
+    Turn a folded-stack frame into the profiler-CSV method form, or None
+    for native/kernel frames. Handles 'pkg/Cls.m', 'pkg.Cls.m(int, String)'
+    and JVM descriptors such as 'pkg/Cls.m(ILjava/lang/String;)V'. Frames
+    without a signature keep their bare 'pkg.Cls.m' name: their overload is
+    unknown, so they must not pose as the zero-argument one.
+    """
+    frame = frame.strip()
+    suffix = FRAME_SUFFIX_RE.search(frame)
+    if suffix:
+        if suffix.group(1) in ('k', 'n'):
+            return None
+        frame = frame[:suffix.start()]
+    name, paren, rest = frame.partition('(')
+    name = name.replace('/', '.')
+    if '.' not in name:
+        return None
+    if not paren:
+        return name
+    if rest.endswith(')'):
+        return f"{name}({rest}"
+    # JVM descriptor: parameters, ')' and the return type
+    params, _, _ = rest.partition(')')
+    try:
+        return f"{name}({','.join(descriptor_params(params))})"
+    except (IndexError, ValueError):
+        return None
 
-def fully_qualify_method(method_name, prefix):
-    match = re.match(r'(.+?)\((.*?)\)', method_name)
-    if not match:
-        return method_name
-    method_base = match.group(1)
-    params = match.group(2)
-    if not params:
-        return method_name
-    param_list = [param.strip() for param in params.split(',')]
-    qualified_params = []
-    for param in param_list:
-        if not param:
+
+def split_stack(stack):
+    """
+    Split a folded stack into frames. JVM descriptors contain ';' too
+    ('m(Ljava/lang/String;)Lpkg/Type;'), so separators inside a parameter
+    list or an object return type are not frame boundaries.
+    """
+    if '(' not in stack:
+        return stack.split(';')
+    frames = []
+    start = i = 0
+    n = len(stack)
+    while i < n:
+        ch = stack[i]
+        if ch == '(':
+            close = stack.find(')', i)
+            i = n if close == -1 else close + 1
+            # Skip an object or array return type up to its own ';'
+            j = i
+            while j < n and stack[j] == '[':
+                j += 1
+            if j < n and stack[j] == 'L':
+                semi = stack.find(';', j)
+                i = n if semi == -1 else semi + 1
             continue
-        if param in PRIMITIVE_TYPES:
-            qualified_params.append(param)
-        elif '.' in param:
-            qualified_params.append(param)
+        if ch == ';':
+            frames.append(stack[start:i])
+            start = i + 1
+        i += 1
+    frames.append(stack[start:])
+    return frames
+
+
+def ingest_folded(path, table, store, sample_interval=1.0):
+    """
+    Stream a collapsed-stack file ('frame;frame;frame <samples>') into the
+    edge store. A stack's samples count once towards the total time of
+    every call edge on it and towards the self time of the edge into its
+    leaf frame; both are expressed as samples * sample_interval.
+    """
+    frame_ids = {}
+    in_scope = table.in_scope
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip().rpartition(' ')
+            if not stack:
+                continue
+            try:
+                samples = float(count)
+            except ValueError:
+                continue
+            weight = samples * sample_interval
+
+            ids = []
+            for frame in split_stack(stack):
+                mid = frame_ids.get(frame, -1)
+                if mid == -1:
+                    normalised = normalise_frame(frame)
+                    if not normalised:
+                        mid = None
+                    elif is_method(normalised):
+                        mid = table.intern(normalised)
+                    else:
+                        mid = table.add(normalised)  # no signature to qualify
+                    frame_ids[frame] = mid
+                if mid is not None:
+                    ids.append(mid)
+
+            seen = set()
+            last = len(ids) - 1
+            for k in range(1, len(ids)):
+                caller, callee = ids[k - 1], ids[k]
+                if not in_scope[callee]:
+                    continue
+                self_time = weight if k == last else 0.0
+                if (caller, callee) in seen:
+                    # recursion: total time was counted higher up the stack
+                    if self_time:
+                        store.add(caller, callee, 0, 0.0, self_time)
+                    continue
+                seen.add((caller, callee))
+                store.add(caller, callee, 0, weight, self_time)
+
+
+FOLDED_LINE_RE = re.compile(r'^[^"\s][^"]*\s[0-9]+(?:\.[0-9]+)?$')
+
+
+def detect_format(path):
+    """
+    .folded/.collapsed files are folded stacks and .txt files are when their
+    first line looks like 'frame;frame <samples>'; everything else is CSV.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".folded", ".collapsed"):
+        return "folded"
+    if ext == ".txt":
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.strip():
+                    return "folded" if FOLDED_LINE_RE.match(line.strip()) else "csv"
+    return "csv"
+
+
+def ingest_file(path, table, store, fmt="auto", sample_interval=1.0):
+    if fmt == "auto":
+        fmt = detect_format(path)
+    if fmt == "folded":
+        ingest_folded(path, table, store, sample_interval)
+    else:
+        ingest_call_tree_csv(path, table, store)
+
+
+def graph_nodes(table, store):
+    """
+    Method nodes of every method on a call edge, sorted by name. Methods
+    seen only in frames without a signature are flagged signatureKnown=false.
+    """
+    names = table.names
+    node_ids = set(store.callers) | set(store.callees)
+    for name in sorted(names[mid] for mid in node_ids):
+        if is_method(name):
+            yield {"fullName": name, "type": "Method"}
         else:
-            if param in TYPE_MAPPING:
-                qualified_params.append(TYPE_MAPPING[param])
-            else:
-                # Try to infer package from the method's class package
-                package_match = re.match(r'(.+)\.\w+\.\w+$', method_base)
-                if package_match:
-                    package = package_match.group(1)
-                    qualified_params.append(f"{package}.{param}")
-                else:
-                    qualified_params.append(param)
-    return f"{method_base}({','.join(qualified_params)})"
-
-
-def main():
+            yield {"fullName": name, "type": "Method", "signatureKnown": False}
+
+
+def graph_edges(table, store):
+    """DCALL edges sorted by (caller, callee), built one at a time."""
+    names = table.names
+    order = sorted(range(len(store)),
+                   key=lambda slot: (names[store.callers[slot]], names[store.callees[slot]]))
+    for slot in order:
+        yield {
+            "relationName": "DCALL",
+            "from": {
+                "nodeType": "Method",
+                "propertyName": "fullName",
+                "propertyValue": names[store.callers[slot]]
+            },
+            "to": {
+                "nodeType": "Method",
+                "propertyName": "fullName",
+                "propertyValue": names[store.callees[slot]]
+            },
+            "invocations": store.invocations[slot],
+            "totalTime": store.total_time[slot],
+            "selfTime": store.self_time[slot]
+        }
+
+
+def build_graph(table, store):
+    return {
+        "probeName": "DynamiCall",
+        "nodes": list(graph_nodes(table, store)),
+        "edges": list(graph_edges(table, store))
+    }
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
-        description="Convert a hierarchical Java profiler CSV (with indentation) into a dynamic call graph JSON."
+        description="Convert a hierarchical Java profiler CSV (with indentation) or folded "
+                    "stacks into a dynamic call graph JSON."
     )
-    parser.add_argument("input_csv", help="Path to the input profiling CSV file (with indented call tree)")
+    parser.add_argument("input_csv", nargs="+",
+                        help="Input profiling CSV files or glob patterns (with indented call tree); "
+                             "all of them are merged into one graph")
     parser.add_argument("-o", "--output", default="output.json",
                         help="Output JSON file path (default: output.json)")
     parser.add_argument("--prefix", default="org.springframework.samples.petclinic.",
-                        help="Default package prefix for FQN resolution (default: Petclinic prefix)")
+                        help="Package prefix of the application's own methods (default: Petclinic prefix)")
+    parser.add_argument("--source",
+                        help="Java source root of the profiled application; its package and import "
+                             "declarations are used to qualify parameter types")
+    parser.add_argument("--format", choices=["auto", "csv", "folded"], default="auto",
+                        help="Input format; auto reads .folded/.collapsed files, and .txt files whose "
+                             "first line is a folded stack, as folded stacks and everything else as "
+                             "CSV (default: auto)")
+    parser.add_argument("--sample-interval", type=float, default=1.0,
+                        help="Time represented by one folded-stack sample (default: 1.0)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes used to parse the input files (default: 1)")
+    add_output_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    input_file = args.input_csv
     output_file = args.output
     prefix = args.prefix.rstrip('.') + '.'  # ensure clean prefix
 
-    nodes_set = set()
-    edges_set = set()
+    symbols = SymbolTable.from_sources(args.source) if args.source else None
+    table = MethodTable(prefix, TypeResolver(symbols))
+    store = EdgeStore()
 
     try:
-        with open(input_file, "r", encoding="utf-8") as f:
-            reader = csv.reader(f, quotechar='"', delimiter=',', skipinitialspace=True)
-            next(reader, None)  # Skip header
-
-            stack = []
-
-            for row in reader:
-                if len(row) < 1:
-                    continue
-                name_with_space = row[0]
-                # Count leading spaces to determine level
-                leading_spaces = len(name_with_space) - len(name_with_space.lstrip(' '))
-                level = leading_spaces // 2  # usually 2 spaces per level in profilers
-                actual_name = name_with_space.strip()
-
-                if actual_name == "Self time" or not is_method(actual_name):
-                    continue
-
-                # Clean up common formatting
-                actual_name = actual_name.replace(' (', '(')
-                actual_name = fully_qualify_method(actual_name, prefix)
-
-                # Pop stack until parent level
-                while stack and stack[-1][0] >= level:
-                    stack.pop()
-
-                if stack:
-                    parent_level, parent_name_raw = stack[-1]
-                    parent_name = parent_name_raw.replace(' (', '(')
-                    parent_name = fully_qualify_method(parent_name, prefix)
-
-                    if (is_method(parent_name) and is_method(actual_name) and
-                            actual_name.startswith(prefix)):
-                        edges_set.add((parent_name, actual_name))
-                        nodes_set.add(parent_name)
-                        nodes_set.add(actual_name)
-
-                stack.append((level, actual_name))
-
-        # Build final graph
-        nodes = [{"fullName": name, "type": "Method"} for name in sorted(nodes_set)]
-        edges = [
-            {
-                "relationName": "DCALL",
-                "from": {
-                    "nodeType": "Method",
-                    "propertyName": "fullName",
-                    "propertyValue": from_name
-                },
-                "to": {
-                    "nodeType": "Method",
-                    "propertyName": "fullName",
-                    "propertyValue": to_name
-                }
-            }
-            for from_name, to_name in sorted(edges_set)
-        ]
-
-        output = {
-            "probeName": "DynamiCall",
-            "nodes": nodes,
-            "edges": edges
-        }
-
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=4)
+        input_files = expand_inputs(args.input_csv)
+        ingest_snapshots(input_files, table, store, args.jobs,
+                         args.format, args.sample_interval)
+        with open_graph(output_file, "DynamiCall", args) as writer:
+            writer.add_nodes(graph_nodes(table, store))
+            writer.add_edges(graph_edges(table, store))
         print(f"Success: Dynamic call graph written to {output_file}")
-        print(f"   Methods: {len(nodes)}, Calls: {len(edges)}")
+        print(f"   Methods: {writer.node_count}, Calls: {writer.edge_count}")
 
-    except FileNotFoundError:
-        print(f"Error: Input file '{input_file}' not found.")
+    except FileNotFoundError as e:
+        print(f"Error: Input file '{e.filename or e}' not found.")
         raise
     except Exception as e:
         print(f"Error processing file: {e}")
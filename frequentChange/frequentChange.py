@@ -2,15 +2,35 @@
 import subprocess
 import javalang
 import os
+import sys
+import re
 import json
 import argparse
+import hashlib
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
 from typing import Dict, List, Tuple, Optional, Set
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probehub.graphwriter import add_output_arguments, open_graph
+from probehub.javasource import java_files_under, read_source, read_source_bytes
+from probehub.resolver import SymbolTable, TypeResolver, parameter_type
+
+# Bump whenever parsing or the cached parse format changes; cached parse
+# results written by another version are discarded.
+PROBE_VERSION = "1.4"
+
+
+# Replaced in main() by one built over the project's symbol table. Names are
+# only resolved in the main process, after the parse cache lookup.
+RESOLVER = TypeResolver()
+
 
 def read_file(path: str) -> str:
-    with open(path, 'r', encoding='utf-8') as f:
-        return f.read()
+    return read_source(path)
 
 
 def get_package(tree) -> Optional[str]:
@@ -19,106 +39,32 @@ def get_package(tree) -> Optional[str]:
     return None
 
 
-def is_primitive(t: str) -> bool:
-    return t in {"boolean", "byte", "char", "short", "int", "long", "float", "double"}
-
-
-def is_java_lang(t: str) -> bool:
-    return t in {
-        "Boolean", "Byte", "Character", "Short", "Integer", "Long",
-        "Float", "Double", "String", "Object", "Class", "ClassLoader"
-    }
-
-
-def is_java_util(t: str) -> bool:
-    return t in {
-        "Collection", "List", "ArrayList", "LinkedList", "Map", "HashMap",
-        "Set", "HashSet", "TreeSet", "Iterator", "Optional", "Date",
-        "Calendar", "Locale"
-    }
-
-
-def is_java_time(t: str) -> bool:
-    return t in {
-        "LocalDate", "LocalDateTime", "LocalTime", "Instant", "Duration", "Period"
-    }
-
-
-def resolve_type(simple: str, imports: List[str], package: Optional[str], seen_types: Set[str]) -> str:
-    """
-    Resolve a simple type name to its fully qualified name.
-    Resolution order:
-      1. Primitive
-      2. java.lang.*
-      3. java.util.*
-      4. java.time.*
-      5. Same package
-      6. Explicit imports
-      7. Fallback → simple
-    """
-    is_arr = simple.endswith("[]")
-    base = simple.rstrip("[]")
-
-    # 1. Primitive
-    if is_primitive(base):
-        return simple
-
-    # 2. java.lang
-    if is_java_lang(base):
-        fqn = f"java.lang.{base}"
-        return f"{fqn}[]" if is_arr else fqn
-
-    # 3. java.util
-    if is_java_util(base):
-        fqn = f"java.util.{base}"
-        return f"{fqn}[]" if is_arr else fqn
-
-    # 4. java.time
-    if is_java_time(base):
-        fqn = f"java.time.{base}"
-        return f"{fqn}[]" if is_arr else fqn
-
-    # 5. Same package
-    if package:
-        same_pkg_fqn = f"{package}.{base}"
-        if same_pkg_fqn not in seen_types:
-            return f"{same_pkg_fqn}[]" if is_arr else same_pkg_fqn
-
-    # 6. Explicit imports
-    for imp in imports:
-        if imp.endswith("." + base):
-            fqn = imp
-            return f"{fqn}[]" if is_arr else fqn
-
-    # 7. Fallback
-    return simple
-
-
 def get_full_method_name(class_name: str, package: Optional[str], method_name: str,
-                         params: List[Tuple[str, str]], imports: List[str], seen: Set[str]) -> str:
-    param_fqns = [resolve_type(p_type, imports, package, seen)
-                  for p_type, _ in params]
+                         params: List[Tuple[str, str]], imports: List[str]) -> str:
     qualified_class = f"{package}.{class_name}" if package else class_name
-    return f"{qualified_class}.{method_name}({','.join(param_fqns)})"
+    return RESOLVER.method_name(qualified_class, method_name,
+                                [p_type for p_type, _ in params], package, imports)
 
 
-def parse_java_file(path: str) -> Dict[str, Tuple[int, int, str, str, List[Tuple[str, str]], str]]:
+def parse_java_source(path: str, source: Optional[str] = None) -> dict:
+    """
+    Methods of one file before their names are resolved:
+    {"package", "imports", "methods": [[class, method, start, end, params]]}.
+    Resolved names depend on the project's other files, so this is the form
+    the parse cache stores; qualify_methods() turns it into full names.
+    """
     try:
-        tree = javalang.parse.parse(read_file(path))
+        tree = javalang.parse.parse(read_file(path) if source is None else source)
     except Exception as e:
         print(f"[ERROR] Parse {path}: {e}")
         return {}
 
     package = get_package(tree)
-    imports = [node.path for _, node in tree.filter(javalang.tree.Import)]
-    seen_types: Set[str] = set()
-    methods: Dict[str, Tuple[int, int, str,
-                             str, List[Tuple[str, str]], str]] = {}
+    imports = [node.path + (".*" if node.wildcard else "")
+               for _, node in tree.filter(javalang.tree.Import) if not node.static]
+    methods = []
 
     for _, class_node in tree.filter(javalang.tree.ClassDeclaration):
-        class_fqn = f"{package}.{class_node.name}" if package else class_node.name
-        seen_types.add(class_fqn)
-
         for member in (class_node.body or []):
             if not isinstance(member, javalang.tree.MethodDeclaration):
                 continue
@@ -128,28 +74,107 @@ def parse_java_file(path: str) -> Dict[str, Tuple[int, int, str, str, List[Tuple
             start = member.position.line
             end = member.body[-1].position.line if member.body else start
 
-            params = []
-            for p in member.parameters:
-                p_type = getattr(p.type, 'name', None)
-                if p_type is None and hasattr(p.type, 'type'):
-                    p_type = getattr(p.type.type, 'name', None)
-                if p_type is None:
-                    p_type = "Object"
-                if getattr(p.type, 'dimensions', 0):
-                    p_type += "[]" * len(p.type.dimensions)
-                params.append((p_type, p.name))
-
-            full = get_full_method_name(
-                class_node.name, package, member.name, params, imports, seen_types)
-            methods[full] = (start, end, class_node.name,
-                             package, params, full)
+            params = [(parameter_type(p), p.name) for p in member.parameters]
+
+            methods.append([class_node.name, member.name, start, end, params])
 
     print(f"[OK] {len(methods)} methods → {os.path.basename(path)}")
+    return {"package": package, "imports": imports, "methods": methods}
+
+
+def qualify_methods(parsed: dict
+                    ) -> Dict[str, Tuple[int, int, str, str, List[Tuple[str, str]], str]]:
+    """full name -> (start, end, class, package, params, full name) of a parse_java_source result."""
+    package, imports = parsed.get("package"), parsed.get("imports", [])
+    methods: Dict[str, Tuple[int, int, str,
+                             str, List[Tuple[str, str]], str]] = {}
+    for class_name, method_name, start, end, params in parsed.get("methods", []):
+        params = [tuple(p) for p in params]
+        full = get_full_method_name(class_name, package, method_name, params, imports)
+        methods[full] = (start, end, class_name, package, params, full)
     return methods
 
 
-def git_log_lines(file_path: str, start: int, end: int) -> Tuple[int, int]:
-    cmd = ['git', 'log', '--oneline', f'-L{start},{end}:{file_path}']
+def parse_java_file(path: str, source: Optional[str] = None
+                    ) -> Dict[str, Tuple[int, int, str, str, List[Tuple[str, str]], str]]:
+    return qualify_methods(parse_java_source(path, source))
+
+
+FIX_KEYWORDS = {"fix", "bug", "issue", "patch", "resolve"}
+
+COMMIT_MARK = "\x1e"
+FIELD_SEP = "\x1f"
+HUNK_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def is_fix(subject: str) -> bool:
+    subject = subject.lower()
+    return any(k in subject for k in FIX_KEYWORDS)
+
+
+class HistoryWindow:
+    """
+    The commits a run is allowed to count, resolved once up front with
+    `git rev-list` so both history modes count exactly the same commits.
+    Walks still start at HEAD (line numbers have to be shifted through the
+    newer commits) but stop at `boundary`, the parent of the oldest commit.
+    """
+
+    def __init__(self, since: Optional[str], until: Optional[str],
+                 max_commits: Optional[int], commits: List[str]):
+        self.since = since
+        self.until = until
+        self.max_commits = max_commits
+        self.commits: Set[str] = set(commits)
+        self.oldest = commits[-1] if commits else None
+        self.boundary = git_rev_parse(f"{self.oldest}^") if self.oldest else None
+
+    def revs(self) -> List[str]:
+        return ['HEAD'] + ([f'^{self.boundary}'] if self.boundary else [])
+
+    def metadata(self) -> dict:
+        meta = {"windowCommits": len(self.commits)}
+        if self.since:
+            meta["windowSince"] = self.since
+        if self.until:
+            meta["windowUntil"] = self.until
+        if self.max_commits:
+            meta["windowMaxCommits"] = self.max_commits
+        if self.oldest:
+            meta["windowOldestCommit"] = self.oldest
+        return meta
+
+
+def resolve_window(since: Optional[str], until: Optional[str],
+                   max_commits: Optional[int], pathspecs: List[str],
+                   first_parent: bool) -> Optional[HistoryWindow]:
+    if not (since or until or max_commits):
+        return None
+    cmd = ['git', 'rev-list'] + (['--first-parent'] if first_parent else [])
+    if since:
+        cmd.append(f'--since={since}')
+    if until:
+        cmd.append(f'--until={until}')
+    if max_commits:
+        cmd.append(f'--max-count={max_commits}')
+    cmd += ['HEAD', '--'] + pathspecs
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"git rev-list: {result.stderr.strip()}")
+    window = HistoryWindow(since, until, max_commits, result.stdout.split())
+    print(f"[INFO] History window: {len(window.commits)} commits")
+    return window
+
+
+def git_log_lines(file_path: str, start: int, end: int,
+                  window: Optional[HistoryWindow] = None) -> Tuple[int, int]:
+    if window is not None and not window.commits:
+        return 0, 0
+    # -L always prints the patch, so mark each commit header and count only those
+    cmd = ['git', 'log', f'--format={COMMIT_MARK}%H{FIELD_SEP}%s',
+           f'-L{start},{end}:{file_path}']
+    if window is not None:
+        cmd += window.revs()
     result = subprocess.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
         if any(x in result.stderr for x in ["no matches", "fatal: file"]):
@@ -157,32 +182,541 @@ def git_log_lines(file_path: str, start: int, end: int) -> Tuple[int, int]:
         print(f"[WARN] git {file_path}:{start}-{end}: {result.stderr.strip()}")
         return 0, 0
 
-    lines = result.stdout.strip().splitlines()
-    total = len(lines)
-    fixes = sum(1 for l in lines if any(k in l.lower()
-                for k in {"fix", "bug", "issue", "patch", "resolve"}))
+    subjects = []
+    for l in result.stdout.split("\n"):
+        if l.startswith(COMMIT_MARK):
+            sha, _, subject = l[1:].partition(FIELD_SEP)
+            if window is None or sha in window.commits:
+                subjects.append(subject)
+    total = len(subjects)
+    fixes = sum(1 for s in subjects if is_fix(s))
     return total, fixes
 
 
-def analyze_file(path: str) -> List[dict]:
-    methods = parse_java_file(path)
+def run_timestamp() -> str:
+    return datetime.now().strftime('%Y-%m-%d_%H%M%S')
+
+
+def changespot_record(full: str, ch: int, fx: int, ts: Optional[str] = None,
+                      window: Optional[HistoryWindow] = None) -> dict:
+    ts = ts or run_timestamp()
+    record = {
+        "full_name": full,
+        "num_changes": ch,
+        "num_fixes": fx,
+        "changespot_id": f"{full}_{ts}"
+    }
+    if window is not None:
+        record["window"] = window.metadata()
+    return record
+
+
+def analyze_file(path: str, ts: Optional[str] = None,
+                 methods: Optional[dict] = None,
+                 window: Optional[HistoryWindow] = None) -> List[dict]:
+    if methods is None:
+        methods = parse_java_file(path)
     out = []
     for full, (s, e, _, _, _, _) in methods.items():
-        ch, fx = git_log_lines(path, s, e)
-        ts = datetime.now().strftime('%Y-%m-%d_%H%M%S')
-        hid = f"{full}_{ts}"
-        out.append({
-            "full_name": full,
-            "num_changes": ch,
-            "num_fixes": fx,
-            "changespot_id": hid
-        })
+        ch, fx = git_log_lines(path, s, e, window)
+        out.append(changespot_record(full, ch, fx, ts, window))
     return out
 
 
-def build_graph(data: List[dict]) -> dict:
-    nodes: List[dict] = []
-    edges: List[dict] = []
+def safe_analyze_file(item: Tuple[str, dict], ts: Optional[str] = None,
+                      window: Optional[HistoryWindow] = None) -> List[dict]:
+    path, methods = item
+    try:
+        return analyze_file(path, ts, methods, window)
+    except Exception as e:
+        print(f"[ERROR] {path}: {e}")
+        return []
+
+
+def safe_parse_java_source(path: str) -> dict:
+    try:
+        return parse_java_source(path)
+    except Exception as e:
+        print(f"[ERROR] {path}: {e}")
+        return {}
+
+
+def map_files(func, items: List, jobs: int) -> List:
+    """
+    Apply `func` to every item, in a process pool when jobs > 1. Items are
+    handed out in chunks and results come back in input order, so the
+    output does not depend on how the workers were scheduled.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, items, chunksize=chunksize))
+
+
+# ---------------------------------------------------------------------------
+# Parse cache
+# ---------------------------------------------------------------------------
+
+def blob_hash(data: bytes) -> str:
+    """Same id `git hash-object` gives the file contents."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk table of parse_java_source results keyed by the file's git blob
+    hash. Least recently used entries beyond `max_entries` are evicted, and
+    the whole table is dropped when PROBE_VERSION changes.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS methods (
+                blob      TEXT PRIMARY KEY,
+                data      TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+        """)
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != PROBE_VERSION:
+            with self.conn:
+                self.conn.execute("DELETE FROM methods")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (PROBE_VERSION,))
+
+    def get(self, blob: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT data FROM methods WHERE blob = ?", (blob,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(
+            "UPDATE methods SET last_used = ? WHERE blob = ?", (time.time(), blob))
+        return json.loads(row[0])
+
+    def put(self, blob: str, parsed: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO methods VALUES (?, ?, ?)",
+            (blob, json.dumps(parsed, ensure_ascii=False), time.time()))
+
+    def close(self):
+        with self.conn:
+            self.conn.execute("""
+                DELETE FROM methods WHERE blob IN (
+                    SELECT blob FROM methods ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?)
+            """, (self.max_entries,))
+        self.conn.close()
+
+
+def parse_java_files(java_files: List[str], jobs: int = 1,
+                     cache: Optional[ParseCache] = None) -> List[dict]:
+    """
+    parse_java_file over every file. Files are parsed in the workers and
+    files whose blob is cached are not parsed at all; names are resolved
+    here, against the symbol table of the current tree.
+    """
+    if cache is None:
+        return [qualify_methods(p) for p in map_files(safe_parse_java_source, java_files, jobs)]
+
+    results: List[Optional[dict]] = []
+    misses: List[int] = []
+    blobs: List[Optional[str]] = []
+    for i, fp in enumerate(java_files):
+        try:
+            blob = blob_hash(read_source_bytes(fp))
+        except OSError as e:
+            print(f"[ERROR] {fp}: {e}")
+            blob = None
+        cached = cache.get(blob) if blob else None
+        if cached is None:
+            misses.append(i)
+        results.append(cached)
+        blobs.append(blob)
+
+    print(f"[INFO] Parse cache: {len(java_files) - len(misses)} hits, {len(misses)} misses")
+    parsed = map_files(safe_parse_java_source, [java_files[i] for i in misses], jobs)
+    for i, source_methods in zip(misses, parsed):
+        results[i] = source_methods
+        if blobs[i] and source_methods:
+            cache.put(blobs[i], source_methods)
+    return [qualify_methods(p) for p in results]
+
+
+# ---------------------------------------------------------------------------
+# Single-pass history mining
+# ---------------------------------------------------------------------------
+
+class TrackedMethod:
+    """A method line range followed backwards through history."""
+
+    __slots__ = ("id", "full_name", "start", "end", "changes", "fixes")
+
+    def __init__(self, id: int, full_name: str, start: int, end: int):
+        self.id = id
+        self.full_name = full_name
+        self.start = start
+        self.end = end
+        self.changes = 0
+        self.fixes = 0
+
+
+Hunk = Tuple[int, int, int, int]  # old_start, old_len, new_start, new_len
+
+
+class CoChangeIndex:
+    """
+    Sparse method-pair co-change counts keyed by TrackedMethod ids. A pair
+    (i, j) with i < j is packed into one int, so memory grows with the
+    pairs that actually changed together rather than with methods².
+    Commits touching more than `max_methods` methods (mass renames,
+    reformatting) are skipped since they say little about coupling and
+    would add a quadratic number of pairs.
+    """
+
+    def __init__(self, max_methods: int):
+        self.max_methods = max_methods
+        self.pairs: Dict[int, int] = {}
+        self.commits = 0
+        self.skipped = 0
+
+    def add_commit(self, ids: Set[int]):
+        if len(ids) < 2:
+            return
+        if len(ids) > self.max_methods:
+            self.skipped += 1
+            return
+        self.commits += 1
+        ordered = sorted(ids)
+        pairs = self.pairs
+        for k, i in enumerate(ordered):
+            hi = i << 32
+            for j in ordered[k + 1:]:
+                key = hi | j
+                pairs[key] = pairs.get(key, 0) + 1
+
+    def frequent_pairs(self, min_support: int) -> List[Tuple[int, int, int]]:
+        return sorted((key >> 32, key & 0xFFFFFFFF, n)
+                      for key, n in self.pairs.items() if n >= min_support)
+
+
+def hunk_touches(hunk: Hunk, start: int, end: int) -> bool:
+    _, _, c, d = hunk
+    if d == 0:
+        # Pure deletion after post-image line c: inside the range if the
+        # lines on both sides of the gap belong to it.
+        return start <= c < end
+    return c <= end and start <= c + d - 1
+
+
+def map_line(hunks: List[Hunk], line: int, is_start: bool) -> int:
+    """Translate a post-image line number into the parent revision's lines."""
+    delta = 0
+    for a, b, c, d in hunks:
+        if d and c <= line <= c + d - 1:
+            # Line was written by this commit: clamp to the lines it replaced
+            if is_start:
+                return a if b else a + 1
+            return a + b - 1 if b else a
+        if (c + d - 1 if d else c) >= line:
+            break
+        delta += d - b
+    return line - delta
+
+
+def apply_file_diff(tracked: Dict[str, List[TrackedMethod]], old_path: Optional[str],
+                    new_path: Optional[str], hunks: List[Hunk], fix: bool,
+                    counted: bool = True, touched: Optional[Set[int]] = None):
+    if new_path is None or new_path not in tracked:
+        return
+    methods = tracked.pop(new_path)
+    if hunks:
+        hunks.sort(key=lambda h: h[2])
+        for m in methods:
+            if counted and any(hunk_touches(h, m.start, m.end) for h in hunks):
+                m.changes += 1
+                if fix:
+                    m.fixes += 1
+                if touched is not None:
+                    touched.add(m.id)
+            m.start = map_line(hunks, m.start, True)
+            m.end = map_line(hunks, m.end, False)
+    if old_path is None:
+        return  # file was created here, nothing older to follow
+    alive = [m for m in methods if m.start <= m.end]
+    if alive:
+        tracked.setdefault(old_path, []).extend(alive)
+
+
+def strip_diff_path(raw: str, prefix: str) -> Optional[str]:
+    raw = raw.rstrip("\t")
+    if raw == "/dev/null":
+        return None
+    return raw[len(prefix):] if raw.startswith(prefix) else raw
+
+
+def mine_history(tracked: Dict[str, List[TrackedMethod]], pathspecs: List[str],
+                 revs: Optional[List[str]] = None,
+                 window: Optional[HistoryWindow] = None,
+                 cochange: Optional[CoChangeIndex] = None):
+    """
+    Walk the first-parent history once with a single `git log -p -U0` stream
+    and attribute every hunk to the method ranges it overlaps. Ranges are
+    shifted into each parent's coordinates as the walk goes back in time and
+    follow renames, so every method ends up with the commits `git log -L`
+    would report for it on a linear history.
+
+    `tracked` is keyed by path and must hold ranges in the coordinates of
+    the first revision walked; on return it holds whatever is still alive
+    at the oldest revision walked, in that revision's coordinates.
+
+    With a window, commits outside it still shift the line ranges but are
+    not counted. With a co-change index, the methods each counted commit
+    touched are added to it.
+    """
+    if not tracked or (window is not None and not window.commits):
+        return
+    if window is not None:
+        revs = window.revs()
+    cmd = ['git', '-c', 'core.quotePath=false', 'log', '-p', '-U0', '-M',
+           '--first-parent', '-m', '--relative', '--no-color', '--no-ext-diff',
+           '--no-textconv', f'--format={COMMIT_MARK}%H{FIELD_SEP}%s'] + \
+        (revs or []) + ['--'] + pathspecs
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, encoding='utf-8', errors='replace')
+
+    fix = False
+    counted = True
+    in_diff = False
+    old_path: Optional[str] = None
+    new_path: Optional[str] = None
+    hunks: List[Hunk] = []
+    pending = 0
+    touched: Optional[Set[int]] = set() if cochange is not None else None
+
+    def flush():
+        if in_diff:
+            apply_file_diff(tracked, old_path, new_path, hunks, fix, counted, touched)
+
+    def end_commit():
+        if touched:
+            cochange.add_commit(touched)
+            touched.clear()
+
+    for line in proc.stdout:
+        line = line.rstrip("\n")
+        if pending:
+            if line[:1] in ("+", "-"):
+                pending -= 1
+            continue
+        if line.startswith(COMMIT_MARK):
+            flush()
+            end_commit()
+            in_diff = False
+            if not tracked:
+                # Every method has reached the commit that introduced it
+                proc.terminate()
+                break
+            sha, _, subject = line[1:].partition(FIELD_SEP)
+            fix = is_fix(subject)
+            counted = window is None or sha in window.commits
+        elif line.startswith("diff --git "):
+            flush()
+            in_diff = True
+            old_path = new_path = None
+            hunks = []
+        elif not in_diff:
+            continue
+        elif line.startswith("--- "):
+            old_path = strip_diff_path(line[4:], "a/")
+        elif line.startswith("+++ "):
+            new_path = strip_diff_path(line[4:], "b/")
+        elif line.startswith("rename from "):
+            old_path = line[len("rename from "):]
+        elif line.startswith("rename to "):
+            new_path = line[len("rename to "):]
+        elif line.startswith("@@ "):
+            m = HUNK_RE.match(line)
+            if m:
+                a, b, c, d = m.groups()
+                b = 1 if b is None else int(b)
+                d = 1 if d is None else int(d)
+                hunks.append((int(a), b, int(c), d))
+                pending = b + d
+    flush()
+    end_commit()
+
+    proc.stdout.close()
+    stderr = proc.stderr.read()
+    if proc.wait() != 0 and tracked:
+        print(f"[WARN] git log: {stderr.strip()}")
+
+
+def track_methods(java_files: List[str], jobs: int = 1,
+                  cache: Optional[ParseCache] = None
+                  ) -> Tuple[Dict[str, List[TrackedMethod]], List[TrackedMethod]]:
+    tracked: Dict[str, List[TrackedMethod]] = {}
+    order: List[TrackedMethod] = []
+    parsed = parse_java_files(java_files, jobs, cache)
+    for fp, methods in zip(java_files, parsed):
+        for full, (s, e, _, _, _, _) in methods.items():
+            m = TrackedMethod(len(order), full, s, e)
+            tracked.setdefault(fp.replace(os.sep, "/"), []).append(m)
+            order.append(m)
+    return tracked, order
+
+
+def analyze_files_single_pass(java_files: List[str], pathspecs: List[str],
+                              ts: Optional[str] = None, jobs: int = 1,
+                              cache: Optional[ParseCache] = None,
+                              window: Optional[HistoryWindow] = None,
+                              cochange: Optional[CoChangeIndex] = None,
+                              min_support: int = 2
+                              ) -> Tuple[List[dict], List[dict]]:
+    """Returns the changespot records and the co-change pairs, if requested."""
+    tracked, order = track_methods(java_files, jobs, cache)
+
+    print(f"[INFO] Mining history once for {len(order)} methods")
+    mine_history(tracked, pathspecs, window=window, cochange=cochange)
+
+    records = [changespot_record(m.full_name, m.changes, m.fixes, ts, window)
+               for m in order]
+    pairs: List[dict] = []
+    if cochange is not None:
+        for i, j, n in cochange.frequent_pairs(min_support):
+            pairs.append({"from": order[i].full_name, "to": order[j].full_name,
+                          "support": n})
+        print(f"[INFO] Co-change: {len(pairs)} pairs with support >= {min_support} "
+              f"({cochange.commits} commits, {cochange.skipped} over the size cap)")
+    return records, pairs
+
+
+# ---------------------------------------------------------------------------
+# Incremental mode
+# ---------------------------------------------------------------------------
+
+def git_rev_parse(rev: str) -> Optional[str]:
+    result = subprocess.run(['git', 'rev-parse', '--verify', '-q', rev],
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def git_is_ancestor(ancestor: str, rev: str) -> bool:
+    result = subprocess.run(['git', 'merge-base', '--is-ancestor', ancestor, rev],
+                            capture_output=True, text=True)
+    return result.returncode == 0
+
+
+class ChangespotStore:
+    """
+    SQLite store of per-method change/fix counters together with the HEAD
+    commit they were computed at. A scope identifies one repository and
+    source tree, so a single database can serve many projects.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                scope    TEXT PRIMARY KEY,
+                head_sha TEXT NOT NULL,
+                updated  TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS methods (
+                scope       TEXT NOT NULL,
+                full_name   TEXT NOT NULL,
+                num_changes INTEGER NOT NULL,
+                num_fixes   INTEGER NOT NULL,
+                PRIMARY KEY (scope, full_name)
+            );
+        """)
+
+    def load(self, scope: str) -> Tuple[Optional[str], Dict[str, Tuple[int, int]]]:
+        row = self.conn.execute(
+            "SELECT head_sha FROM runs WHERE scope = ?", (scope,)).fetchone()
+        if row is None:
+            return None, {}
+        counters = {
+            name: (ch, fx) for name, ch, fx in self.conn.execute(
+                "SELECT full_name, num_changes, num_fixes FROM methods WHERE scope = ?",
+                (scope,))
+        }
+        return row[0], counters
+
+    def save(self, scope: str, head_sha: str, counters: Dict[str, Tuple[int, int]]):
+        with self.conn:
+            self.conn.execute("DELETE FROM methods WHERE scope = ?", (scope,))
+            self.conn.executemany(
+                "INSERT INTO methods VALUES (?, ?, ?, ?)",
+                ((scope, name, ch, fx) for name, (ch, fx) in counters.items()))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                (scope, head_sha, datetime.now().isoformat(timespec='seconds')))
+
+    def close(self):
+        self.conn.close()
+
+
+def analyze_files_incremental(java_files: List[str], pathspecs: List[str],
+                              store: ChangespotStore, scope: str,
+                              jobs: int = 1,
+                              cache: Optional[ParseCache] = None) -> List[dict]:
+    """
+    Update the stored counters with the commits in `last_sha..HEAD` only.
+    Methods the store has never seen (new files, changed signatures) that
+    already existed at `last_sha` get their older history mined once.
+    """
+    head = git_rev_parse("HEAD")
+    if head is None:
+        raise RuntimeError("cannot resolve HEAD")
+
+    last_sha, stored = store.load(scope)
+    if last_sha and not git_is_ancestor(last_sha, head):
+        print(f"[WARN] {last_sha[:12]} is not an ancestor of HEAD, full rescan")
+        last_sha, stored = None, {}
+
+    tracked, order = track_methods(java_files, jobs, cache)
+
+    if last_sha is None:
+        print(f"[INFO] No previous run, mining full history for {len(order)} methods")
+        mine_history(tracked, pathspecs, [head])
+    else:
+        print(f"[INFO] Mining {last_sha[:12]}..{head[:12]} for {len(order)} methods")
+        if last_sha != head:
+            mine_history(tracked, pathspecs, [f"{last_sha}..{head}"])
+        for m in order:
+            ch, fx = stored.get(m.full_name, (0, 0))
+            m.changes += ch
+            m.fixes += fx
+        unseen: Dict[str, List[TrackedMethod]] = {}
+        for path, methods in tracked.items():
+            fresh = [m for m in methods if m.full_name not in stored]
+            if fresh:
+                unseen[path] = fresh
+        if unseen:
+            print(f"[INFO] Mining older history for "
+                  f"{sum(len(v) for v in unseen.values())} new methods")
+            mine_history(unseen, pathspecs, [last_sha])
+
+    store.save(scope, head, {m.full_name: (m.changes, m.fixes) for m in order})
+
+    # Ids are tied to the analysed commit so consecutive runs line up
+    return [changespot_record(m.full_name, m.changes, m.fixes, head[:12])
+            for m in order]
+
+
+def graph_items(data: List[dict], cochanges: Optional[List[dict]] = None):
+    """("node", node) / ("edge", edge) pairs of the Changespot graph, in output order."""
     seen = set()
 
     for d in data:
@@ -191,62 +725,144 @@ def build_graph(data: List[dict]) -> dict:
         ch = d["num_changes"]
         fx = d["num_fixes"]
 
-        nodes.append({"type": "Method", "fullName": f})
+        yield "node", {"type": "Method", "fullName": f}
 
         if hid not in seen:
-            nodes.append({
+            node = {
                 "type": "Changespot",
                 "numOfChanges": ch,
                 "numOfFixes": fx,
                 "id": hid
-            })
+            }
+            node.update(d.get("window", {}))
+            yield "node", node
             seen.add(hid)
 
-        edges.append({
+        yield "edge", {
             "relationName": "Changed",
             "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": f},
             "to":   {"nodeType": "Changespot", "propertyName": "id", "propertyValue": hid}
-        })
+        }
+
+    for c in cochanges or []:
+        yield "edge", {
+            "relationName": "CO_CHANGED",
+            "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": c["from"]},
+            "to":   {"nodeType": "Method", "propertyName": "fullName", "propertyValue": c["to"]},
+            "support": c["support"]
+        }
+
 
-    return {"probeName": "Changespot", "nodes": nodes, "edges": edges}
+def build_graph(data: List[dict], cochanges: Optional[List[dict]] = None) -> dict:
+    graph = {"probeName": "Changespot", "nodes": [], "edges": []}
+    for kind, item in graph_items(data, cochanges):
+        graph["nodes" if kind == "node" else "edges"].append(item)
+    return graph
 
 
-def save_json(path: str, obj: dict):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
-    print(f"[OK] Saved → {path}")
+def save_graph(path: str, data: List[dict], cochanges: Optional[List[dict]], args) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open_graph(path, "Changespot", args) as writer:
+        writer.write_items(graph_items(data, cochanges))
+    print(f"[OK] Saved → {path} ({writer.node_count} nodes, {writer.edge_count} edges)")
 
 
-def main():
+def main(argv=None):
     p = argparse.ArgumentParser(
         description="Changespot Analyzer – refined FQN resolution")
     p.add_argument("--src", required=True, help="src/main/java")
     p.add_argument("--out", required=True, help="output.json")
     p.add_argument("--git-root", default=".", help="git repo root")
-    args = p.parse_args()
+    p.add_argument("--history-mode", choices=["line-log", "single-pass"],
+                   default="line-log",
+                   help="line-log: one `git log -L` per method; "
+                        "single-pass: one `git log -p` stream for all files")
+    p.add_argument("--jobs", type=int, default=1,
+                   help="worker processes for parsing and history mining")
+    p.add_argument("--since", help="only count commits more recent than this "
+                                   "date (any format `git log --since` accepts)")
+    p.add_argument("--until", help="only count commits older than this date")
+    p.add_argument("--max-commits", type=int,
+                   help="only count the N most recent commits touching --src")
+    p.add_argument("--cochange", action="store_true",
+                   help="also emit CO_CHANGED edges between methods that change "
+                        "in the same commits (implies single-pass)")
+    p.add_argument("--cochange-min-support", type=int, default=2,
+                   help="commits a method pair must share to get an edge")
+    p.add_argument("--cochange-max-methods", type=int, default=50,
+                   help="ignore commits touching more methods than this")
+    p.add_argument("--incremental", action="store_true",
+                   help="reuse counters stored by the previous run and only "
+                        "mine commits added since then (implies single-pass)")
+    p.add_argument("--cache-dir",
+                   default=os.path.join(os.path.expanduser("~"), ".cache", "probe-hub"),
+                   help="directory holding the incremental changespot database "
+                        "and the parse cache")
+    p.add_argument("--no-parse-cache", action="store_true",
+                   help="always re-parse every file with javalang")
+    p.add_argument("--parse-cache-entries", type=int, default=100000,
+                   help="files kept in the parse cache before LRU eviction")
+    add_output_arguments(p)
+    args = p.parse_args(argv)
+    if args.incremental and (args.since or args.until or args.max_commits):
+        p.error("--incremental keeps full-history counters and cannot be "
+                "combined with --since/--until/--max-commits")
+    if args.incremental and args.cochange:
+        p.error("--cochange needs the full history walk and cannot be "
+                "combined with --incremental")
+    if args.cochange:
+        args.history_mode = "single-pass"
 
     git_root = os.path.abspath(args.git_root)
     src_dir = os.path.abspath(args.src)
     os.chdir(git_root)
 
-    java_files = [
-        os.path.relpath(os.path.join(r, f), git_root)
-        for r, _, fs in os.walk(src_dir)
-        for f in fs if f.endswith(".java")
-    ]
+    java_files = sorted(os.path.relpath(f, git_root) for f in java_files_under(src_dir))
 
     print(f"[INFO] {len(java_files)} Java files")
 
-    all_data: List[dict] = []
-    for fp in java_files:
-        try:
-            all_data.extend(analyze_file(fp))
-        except Exception as e:
-            print(f"[ERROR] {fp}: {e}")
+    # Project types resolve on-demand imports the same way the other probes do
+    global RESOLVER
+    RESOLVER = TypeResolver(SymbolTable.from_sources(src_dir, java_files))
 
-    graph = build_graph(all_data)
-    save_json(args.out, graph)
+    # One timestamp per run keeps changespot ids identical for any --jobs
+    ts = run_timestamp()
+    cache = None
+    if not args.no_parse_cache:
+        cache = ParseCache(os.path.join(args.cache_dir, "parse-cache.sqlite"),
+                           args.parse_cache_entries)
+
+    all_data: List[dict] = []
+    cochanges: List[dict] = []
+    pathspec = os.path.relpath(src_dir, git_root)
+    window = resolve_window(args.since, args.until, args.max_commits, [pathspec],
+                            first_parent=args.history_mode == "single-pass")
+    try:
+        if args.incremental:
+            store = ChangespotStore(os.path.join(args.cache_dir, "changespot.sqlite"))
+            try:
+                all_data = analyze_files_incremental(
+                    java_files, [pathspec], store, f"{git_root}:{pathspec}",
+                    args.jobs, cache)
+            finally:
+                store.close()
+        elif args.history_mode == "single-pass":
+            cochange = (CoChangeIndex(args.cochange_max_methods)
+                        if args.cochange else None)
+            all_data, cochanges = analyze_files_single_pass(
+                java_files, [pathspec], ts, args.jobs, cache, window,
+                cochange, args.cochange_min_support)
+        else:
+            parsed = parse_java_files(java_files, args.jobs, cache)
+            per_file = map_files(partial(safe_analyze_file, ts=ts, window=window),
+                                 list(zip(java_files, parsed)), args.jobs)
+            for records in per_file:
+                all_data.extend(records)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    save_graph(args.out, all_data, cochanges, args)
 
 
 if __name__ == "__main__":
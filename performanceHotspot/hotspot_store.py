@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Columnar history of hotspot runs.
+
+Every run appended by performance-hotspot.py (--store) becomes a slice of
+rows in one binary file per column, next to a method dictionary and a run
+index:
+
+    methods.txt        method name per line, line number = method id
+    runs.jsonl         one record per committed run: timestamp, row offset,
+                       row count, method dictionary size
+    method_id.i32      int32 method id per row
+    <metric>.f64       float64 value per row (NaN when the run had no value)
+
+Columns are read through mmap, so queries only touch the pages of the runs
+they look at and never re-parse the original CSVs.
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+METRICS = ["self_time", "self_time_cpu", "total_time", "total_time_cpu",
+           "invocations", "live_bytes", "allocated_objects"]
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def column_file(name):
+    return f"{name}.i32" if name == "method_id" else f"{name}.f64"
+
+
+class RunAppender:
+    """Buffers one run's rows in typed arrays until it is committed."""
+
+    def __init__(self, store, timestamp):
+        self.store = store
+        self.timestamp = timestamp
+        self.columns = {"method_id": array('i')}
+        self.columns.update((metric, array('d')) for metric in METRICS)
+
+    def add(self, item):
+        self.columns["method_id"].append(self.store.method_id(item["method_name"]))
+        for metric in METRICS:
+            value = item.get(metric)
+            self.columns[metric].append(math.nan if value is None else float(value))
+
+    def observe(self, items):
+        for item in items:
+            self.add(item)
+            yield item
+
+    def commit(self):
+        return self.store.commit(self)
+
+
+class HotspotStore:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.runs = []
+        runs_path = os.path.join(path, "runs.jsonl")
+        if os.path.exists(runs_path):
+            with open(runs_path, encoding="utf-8") as f:
+                self.runs = [json.loads(line) for line in f if line.strip()]
+
+        method_count = self.runs[-1]["methods"] if self.runs else 0
+        self.methods = []
+        methods_path = os.path.join(path, "methods.txt")
+        if os.path.exists(methods_path):
+            with open(methods_path, encoding="utf-8") as f:
+                for line in f:
+                    if len(self.methods) == method_count:
+                        break
+                    self.methods.append(line.rstrip("\n"))
+        self._ids = {name: i for i, name in enumerate(self.methods)}
+        self._committed_methods = len(self.methods)
+        self._maps = {}
+
+    @property
+    def rows(self):
+        return self.runs[-1]["offset"] + self.runs[-1]["rows"] if self.runs else 0
+
+    def method_id(self, name):
+        mid = self._ids.get(name)
+        if mid is None:
+            mid = len(self.methods)
+            self._ids[name] = mid
+            self.methods.append(name)
+        return mid
+
+    def begin_run(self, timestamp):
+        return RunAppender(self, timestamp)
+
+    def commit(self, appender):
+        """
+        Append a run's rows. Column files are first cut back to the last
+        committed row, so a crash between writes never leaves stray rows;
+        the run only becomes visible once its runs.jsonl record is written.
+        """
+        self.close()
+        offset = self.rows
+        for name, values in appender.columns.items():
+            with open(os.path.join(self.path, column_file(name)), "ab") as f:
+                f.truncate(offset * values.itemsize)
+                values.tofile(f)
+
+        methods_path = os.path.join(self.path, "methods.txt")
+        with open(methods_path, "a", encoding="utf-8") as f:
+            f.truncate(sum(len(m.encode("utf-8")) + 1
+                           for m in self.methods[:self._committed_methods]))
+            for name in self.methods[self._committed_methods:]:
+                f.write(name + "\n")
+        self._committed_methods = len(self.methods)
+
+        run = {
+            "run": len(self.runs),
+            "timestamp": appender.timestamp,
+            "offset": offset,
+            "rows": len(appender.columns["method_id"]),
+            "methods": len(self.methods),
+        }
+        with open(os.path.join(self.path, "runs.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        self.runs.append(run)
+        return run
+
+    def column(self, name):
+        """Memory-mapped, read-only view of a column over all committed rows."""
+        if name in self._maps:
+            return self._maps[name][1]
+        typecode = 'i' if name == "method_id" else 'd'
+        size = self.rows * array(typecode).itemsize
+        if size == 0:
+            return memoryview(b"").cast(typecode)
+        with open(os.path.join(self.path, column_file(name)), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = memoryview(mapped).cast(typecode)
+        self._maps[name] = (mapped, view)
+        return view
+
+    def close(self):
+        for mapped, view in self._maps.values():
+            view.release()
+            mapped.close()
+        self._maps.clear()
+
+    def run_values(self, run, metric):
+        """{method_id: value} for one run."""
+        start, end = run["offset"], run["offset"] + run["rows"]
+        ids = self.column("method_id")[start:end]
+        values = self.column(metric)[start:end]
+        return dict(zip(ids.tolist(), values.tolist()))
+
+    def trend(self, method, metric="self_time", last=10):
+        """[(timestamp, value)] of one method over the last N runs it appears in."""
+        mid = self._ids.get(method)
+        if mid is None or mid >= self._committed_methods:
+            return []
+        points = []
+        for run in reversed(self.runs):
+            start, end = run["offset"], run["offset"] + run["rows"]
+            ids = self.column("method_id")[start:end].tolist()
+            try:
+                row = start + ids.index(mid)
+            except ValueError:
+                continue
+            points.append((run["timestamp"], self.column(metric)[row]))
+            if len(points) == last:
+                break
+        return points[::-1]
+
+    def p90_growth(self, metric="self_time", days=7, now=None):
+        """
+        Methods whose p90 of `metric` over the runs of the last `days` days
+        is higher than over the `days` days before, as
+        [(method, p90_before, p90_after)] sorted by growth.
+        """
+        now = now or datetime.now()
+        split = now - timedelta(days=days)
+        start = split - timedelta(days=days)
+        before, after = {}, {}
+        for run in self.runs:
+            ts = datetime.strptime(run["timestamp"], TIMESTAMP_FORMAT)
+            if start <= ts < split:
+                bucket = before
+            elif split <= ts <= now:
+                bucket = after
+            else:
+                continue
+            for mid, value in self.run_values(run, metric).items():
+                if not math.isnan(value):
+                    bucket.setdefault(mid, []).append(value)
+
+        grown = []
+        for mid, values in after.items():
+            if mid not in before:
+                continue
+            old = percentile(sorted(before[mid]), 90)
+            new = percentile(sorted(values), 90)
+            if new > old:
+                grown.append((self.methods[mid], old, new))
+        grown.sort(key=lambda g: g[2] - g[1], reverse=True)
+        return grown
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the columnar hotspot history written by performance-hotspot.py --store.")
+    parser.add_argument("store", help="store directory")
+    sub = parser.add_subparsers(dest="query", required=True)
+
+    trend = sub.add_parser("trend", help="values of one method over the last N runs")
+    trend.add_argument("method", help="method fullName, parameter list included, e.g. "
+                                          "'pkg.Cls.m(java.lang.String,int)'")
+    trend.add_argument("--metric", choices=METRICS, default="self_time")
+    trend.add_argument("--last", type=int, default=10, help="number of runs (default: 10)")
+
+    growth = sub.add_parser("p90-growth",
+                            help="methods whose p90 grew in the last DAYS days "
+                                 "compared with the DAYS days before")
+    growth.add_argument("--metric", choices=METRICS, default="self_time")
+    growth.add_argument("--days", type=int, default=7, help="window length (default: 7)")
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.store):
+        print(f"ERROR: Store not found: {args.store}")
+        sys.exit(1)
+
+    store = HotspotStore(args.store)
+    try:
+        if args.query == "trend":
+            for timestamp, value in store.trend(args.method, args.metric, args.last):
+                print(f"{timestamp}\t{value}")
+        else:
+            for method, old, new in store.p90_growth(args.metric, args.days):
+                print(f"{method}\t{old} -> {new}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,21 @@
+import argparse
 import csv
-import json
+import heapq
 import re
 import sys
 import os
+from array import array
 from datetime import datetime
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hotspot_store import HotspotStore, percentile
+from probehub.graphwriter import GraphWriter, add_output_arguments, output_path
+from probehub.resolver import SymbolTable, TypeResolver
 
-def is_primitive_type(type_name):
-    return type_name in {"boolean", "byte", "char", "short", "int", "long", "float", "double"}
 
-
-def is_wrapper_class(type_name):
-    return type_name in {
-        "Boolean", "Byte", "Character", "Short", "Integer", "Long",
-        "Float", "Double", "String", "Object", "Class", "ClassLoader"
-    }
-
-
-def transform_method_signature(method_signature):
-    """Convert YourKit-style method name to clean full signature."""
-    if '(' not in method_signature:
-        return None
-
-    method_name, params_part = method_signature.split('(', 1)
-    params = [p.strip()
-              for p in params_part.rstrip(')').split(',') if p.strip()]
-
-    # Common fixes for Spring / Java types
-    replacements = {
-        "Locale": "java.util.Locale",
-        "BindingResult": "org.springframework.validation.BindingResult",
-        "Model": "org.springframework.ui.Model",
-        "RedirectAttributes": "org.springframework.web.servlet.mvc.support.RedirectAttributes",
-        "HttpServletRequest": "javax.servlet.http.HttpServletRequest",
-        "HttpServletResponse": "javax.servlet.http.HttpServletResponse",
-    }
-
-    converted = []
-    for p in params:
-        if p in replacements:
-            converted.append(replacements[p])
-        elif is_primitive_type(p):
-            converted.append(p)
-        elif is_wrapper_class(p):
-            converted.append(f"java.lang.{p}")
-        else:
-            converted.append(p)
-
-    return f"{method_name.strip()}".replace("()", f"({','.join(converted)})")
+# Replaced by main() when --source gives the application's symbol table
+RESOLVER = TypeResolver()
 
 
 def extract_number(value):
@@ -61,51 +28,105 @@ def extract_integer(value):
     return int(match.group(1)) if match else 0
 
 
-def parse_performance_csv(csv_path):
-    data = []
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+DEFAULT_PACKAGES = ["org.springframework.samples.petclinic"]
+
 
+def iter_profile_rows(csv_path, packages):
+    """Yield (signature, row) for every row whose method is in one of the packages."""
+    packages = tuple(packages)
     with open(csv_path, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             name = row["Name"].strip()
-            if not name.startswith("org.springframework.samples.petclinic"):
+            if not name.startswith(packages):
                 continue
 
-            sig = transform_method_signature(name)
-            if not sig:
+            if '(' not in name:
                 continue
 
-            data.append({
-                "method_name": sig.replace(" ", ""),
-                "self_time": extract_number(row.get("Self Time", "0")),
-                "self_time_cpu": extract_number(row.get("Self Time (CPU)", "0")),
-                "total_time": extract_number(row.get("Total Time", "0")),
-                "total_time_cpu": extract_number(row.get("Total Time (CPU)", "0")),
-                "invocations": extract_integer(row.get("Invocations", "0")),
-                "timestamp": timestamp
-            })
-    return data
+            yield RESOLVER.qualify_signature(name), row
 
 
-def parse_memory_csv(csv_path):
-    data = {}
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            name = row["Name"].strip()
-            if not name.startswith("org.springframework.samples.petclinic"):
-                continue
+def performance_record(sig, row, timestamp):
+    return {
+        "method_name": sig,
+        "self_time": extract_number(row.get("Self Time", "0")),
+        "self_time_cpu": extract_number(row.get("Self Time (CPU)", "0")),
+        "total_time": extract_number(row.get("Total Time", "0")),
+        "total_time_cpu": extract_number(row.get("Total Time (CPU)", "0")),
+        "invocations": extract_integer(row.get("Invocations", "0")),
+        "timestamp": timestamp
+    }
 
-            sig = transform_method_signature(name)
-            if not sig:
-                continue
 
-            data[sig] = {
-                "live_bytes": extract_number(row.get("Live Bytes", "0")),
-                "allocated_objects": extract_integer(row.get("Allocated Objects", "0"))
-            }
-    return data
+def memory_record(row):
+    return {
+        "live_bytes": extract_number(row.get("Live Bytes", "0")),
+        "allocated_objects": extract_integer(row.get("Allocated Objects", "0"))
+    }
+
+
+def parse_performance_csv(csv_path, packages=DEFAULT_PACKAGES):
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return [performance_record(sig, row, timestamp)
+            for sig, row in iter_profile_rows(csv_path, packages)]
+
+
+def parse_memory_csv(csv_path, packages=DEFAULT_PACKAGES):
+    return {sig: memory_record(row) for sig, row in iter_profile_rows(csv_path, packages)}
+
+
+def join_profiles(perf_csv, mem_csv, packages, timestamp):
+    """
+    Hash-join performance rows with memory rows on their signature and yield
+    every performance record with its memory columns attached. Only the
+    smaller file is held in memory, as a dict keyed by signature; the
+    larger one is streamed through it. Records come out in performance-CSV
+    order either way.
+    """
+    if os.path.getsize(mem_csv) <= os.path.getsize(perf_csv):
+        mem_index = {sig: memory_record(row)
+                     for sig, row in iter_profile_rows(mem_csv, packages)}
+        for sig, row in iter_profile_rows(perf_csv, packages):
+            item = performance_record(sig, row, timestamp)
+            if sig in mem_index:
+                item.update(mem_index[sig])
+            yield item
+        return
+
+    perf_items = [performance_record(sig, row, timestamp)
+                  for sig, row in iter_profile_rows(perf_csv, packages)]
+    perf_index = {}
+    for item in perf_items:
+        perf_index.setdefault(item["method_name"], []).append(item)
+    for sig, row in iter_profile_rows(mem_csv, packages):
+        for item in perf_index.get(sig, ()):
+            item.update(memory_record(row))
+    yield from perf_items
+
+
+def hotspot_node(item):
+    hotspot = {
+        "type": "PerformanceHotspot",
+        "id": f"{item['method_name']}_{item['timestamp']}",
+        "self_time": item["self_time"],
+        "self_time_cpu": item["self_time_cpu"],
+        "total_time": item["total_time"],
+        "total_time_cpu": item["total_time_cpu"],
+        "invocations": item["invocations"],
+    }
+    if "live_bytes" in item:
+        hotspot["live_bytes"] = item["live_bytes"]
+        hotspot["allocated_objects"] = item["allocated_objects"]
+    return hotspot
+
+
+def hotspot_edge(method, hotspot_id):
+    return {
+        "relationName": "HASPERFORMANCE",
+        "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": method},
+        "to": {"nodeType": "PerformanceHotspot", "propertyName": "id", "propertyValue": hotspot_id}
+    }
 
 
 def build_graph(perf_data, mem_data):
@@ -115,22 +136,9 @@ def build_graph(perf_data, mem_data):
 
     for item in perf_data:
         method = item["method_name"]
-        hotspot_id = f"{method}_{item['timestamp']}"
-
-        hotspot = {
-            "type": "PerformanceHotspot",
-            "id": hotspot_id,
-            "self_time": item["self_time"],
-            "self_time_cpu": item["self_time_cpu"],
-            "total_time": item["total_time"],
-            "total_time_cpu": item["total_time_cpu"],
-            "invocations": item["invocations"],
-        }
-
         if method in mem_data:
-            mem = mem_data[method]
-            hotspot["live_bytes"] = mem["live_bytes"]
-            hotspot["allocated_objects"] = mem["allocated_objects"]
+            item = dict(item, **mem_data[method])
+        hotspot = hotspot_node(item)
 
         hotspot_nodes.append(hotspot)
 
@@ -139,11 +147,7 @@ def build_graph(perf_data, mem_data):
             "fullName": method
         })
 
-        edges.append({
-            "relationName": "HASPERFORMANCE",
-            "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": method},
-            "to": {"nodeType": "PerformanceHotspot", "propertyName": "id", "propertyValue": hotspot_id}
-        })
+        edges.append(hotspot_edge(method, hotspot["id"]))
 
     return {
         "probeName": "HotSpot",
@@ -152,42 +156,260 @@ def build_graph(perf_data, mem_data):
     }
 
 
-def main():
-    if len(sys.argv) != 4:
-        print("ERROR: Exactly 3 arguments required.\n")
-        print("Usage:")
-        print(
-            "  python hotspot_analyzer.py <performance.csv> <memory.csv> <output-directory>")
-        print("\nExample:")
-        print("  python hotspot_analyzer.py perf.csv memory.csv ./results")
-        sys.exit(1)
-
-    perf_csv = sys.argv[1]
-    mem_csv = sys.argv[2]
-    out_dir = Path(sys.argv[3])
-
-    for p in [perf_csv, mem_csv]:
+SELECTION_METRICS = ["self_time", "self_time_cpu", "total_time", "total_time_cpu",
+                     "invocations", "live_bytes", "allocated_objects"]
+
+
+class RunStats:
+    """Distribution statistics of one run, gathered while records stream past."""
+
+    def __init__(self, metric="self_time"):
+        self.metric = metric
+        self.self_times = array('d')
+        self.metric_values = array('d')
+        self.allocated_objects = 0
+        self.methods = 0
+
+    def observe(self, items):
+        for item in items:
+            self.methods += 1
+            self.self_times.append(item["self_time"])
+            self.metric_values.append(item.get(self.metric, 0))
+            self.allocated_objects += item.get("allocated_objects", 0)
+            yield item
+
+    def metric_percentile(self, pct):
+        return percentile(sorted(self.metric_values), pct)
+
+    def summary_node(self, timestamp, selection):
+        self_times = sorted(self.self_times)
+        node = {
+            "type": "PerformanceSummary",
+            "id": f"run_{timestamp}",
+            "methods": self.methods,
+            "self_time_p50": percentile(self_times, 50),
+            "self_time_p90": percentile(self_times, 90),
+            "self_time_p99": percentile(self_times, 99),
+            "self_time_total": sum(self_times),
+            "allocated_objects_total": self.allocated_objects,
+        }
+        node.update(selection)
+        return node
+
+
+def select_top_k(items, k, metric):
+    """
+    Keep the k records with the largest metric in one pass over the stream,
+    using a bounded min-heap. Ties keep the earlier record. The result is
+    ordered by metric, largest first.
+    """
+    heap = []
+    for seq, item in enumerate(items):
+        entry = (item.get(metric, 0), -seq, item)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    return [item for _, _, item in sorted(heap, key=lambda e: e[:2], reverse=True)]
+
+
+def write_graph(items, writer, summary=None):
+    """
+    Stream Method/PerformanceHotspot nodes and their edges to a GraphWriter.
+    `summary` is called once the items are exhausted and its node, if any,
+    is written last.
+    """
+    try:
+        for item in items:
+            method = item["method_name"]
+            hotspot = hotspot_node(item)
+            writer.add_node({"type": "Method", "fullName": method})
+            writer.add_node(hotspot)
+            writer.add_edge(hotspot_edge(method, hotspot["id"]))
+        if summary is not None:
+            writer.add_node(summary())
+    finally:
+        writer.close()
+    return writer.node_count, writer.edge_count
+
+
+COMPARED_METRICS = ["self_time", "total_time_cpu", "invocations",
+                    "live_bytes", "allocated_objects"]
+DEFAULT_REGRESSION_RATIO = 1.2
+
+
+def parse_thresholds(specs, default_ratio):
+    """['self_time=1.5', ...] -> {metric: max allowed candidate/baseline ratio}"""
+    thresholds = {metric: default_ratio for metric in COMPARED_METRICS}
+    for spec in specs or []:
+        metric, _, value = spec.partition("=")
+        if metric not in thresholds or not value:
+            raise ValueError(f"bad threshold '{spec}', expected one of "
+                             f"{', '.join(COMPARED_METRICS)}=<ratio>")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def compare_profiles(baseline_items, candidate_items, thresholds):
+    """
+    Join candidate records to baseline records per method and yield
+    (method, comparison) for every method that regressed on at least one
+    metric, i.e. whose candidate/baseline ratio exceeds its threshold.
+    Methods missing from the baseline have nothing to regress from.
+    """
+    baseline = {item["method_name"]: item for item in baseline_items}
+    for item in candidate_items:
+        method = item["method_name"]
+        base = baseline.get(method)
+        if base is None:
+            continue
+
+        comparison = {}
+        regressed = []
+        for metric in COMPARED_METRICS:
+            if metric not in item and metric not in base:
+                continue
+            old = base.get(metric, 0)
+            new = item.get(metric, 0)
+            ratio = new / old if old else None
+            comparison[f"baseline_{metric}"] = old
+            comparison[f"candidate_{metric}"] = new
+            comparison[f"{metric}_delta"] = new - old
+            comparison[f"{metric}_ratio"] = ratio
+            if new > old and (ratio is None or ratio > thresholds[metric]):
+                regressed.append(metric)
+
+        if regressed:
+            comparison["regressed_metrics"] = regressed
+            yield method, comparison
+
+
+def write_regressions(regressions, writer, timestamp):
+    """Stream Method/PerformanceRegression nodes and their edges to a GraphWriter."""
+    try:
+        for method, comparison in regressions:
+            regression_id = f"{method}_{timestamp}"
+            writer.add_node({"type": "Method", "fullName": method})
+            writer.add_node(dict({"type": "PerformanceRegression", "id": regression_id},
+                                 **comparison))
+            writer.add_edge({
+                "relationName": "HASREGRESSION",
+                "from": {"nodeType": "Method", "propertyName": "fullName", "propertyValue": method},
+                "to": {"nodeType": "PerformanceRegression", "propertyName": "id",
+                       "propertyValue": regression_id}
+            })
+    finally:
+        writer.close()
+    return writer.node_count, writer.edge_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Join YourKit performance and memory CSVs into a PerformanceHotspot graph.")
+    parser.add_argument("performance_csv", help="YourKit CPU/time profiling CSV")
+    parser.add_argument("memory_csv", help="YourKit memory profiling CSV")
+    parser.add_argument("output_dir", help="folder where performance-tracking2.json is saved")
+    parser.add_argument("-p", "--package", action="append", dest="packages",
+                        help="only keep methods in this package (repeatable; "
+                             "default: org.springframework.samples.petclinic)")
+    parser.add_argument("--baseline", nargs=2, metavar=("PERF_CSV", "MEM_CSV"),
+                        help="compare against this baseline run instead of writing a "
+                             "snapshot; the positional CSVs are the candidate run")
+    parser.add_argument("--regression-ratio", type=float, default=DEFAULT_REGRESSION_RATIO,
+                        help="candidate/baseline ratio above which a metric regressed "
+                             f"(default: {DEFAULT_REGRESSION_RATIO})")
+    parser.add_argument("--threshold", action="append", metavar="METRIC=RATIO",
+                        help="per-metric ratio overriding --regression-ratio, e.g. "
+                             "self_time=1.5 (repeatable)")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--top-k", type=int, metavar="K",
+                           help="only emit the K methods with the largest --metric")
+    selection.add_argument("--percentile", type=float, metavar="P",
+                           help="only emit methods whose --metric is at or above "
+                                "its P-th percentile")
+    parser.add_argument("--metric", choices=SELECTION_METRICS, default="self_time",
+                        help="metric used by --top-k/--percentile (default: self_time)")
+    parser.add_argument("--store", metavar="DIR",
+                        help="also append every method of this run to the columnar "
+                             "history store in DIR (query it with hotspot_store.py)")
+    parser.add_argument("--source", metavar="DIR",
+                        help="Java source root of the profiled application; its package and "
+                             "import declarations are used to qualify parameter types")
+    add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.source:
+        global RESOLVER
+        RESOLVER = TypeResolver(SymbolTable.from_sources(args.source))
+
+    perf_csv = args.performance_csv
+    mem_csv = args.memory_csv
+    out_dir = Path(args.output_dir)
+    packages = args.packages or DEFAULT_PACKAGES
+
+    try:
+        thresholds = parse_thresholds(args.threshold, args.regression_ratio)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for p in [perf_csv, mem_csv] + (args.baseline or []):
         if not Path(p).is_file():
             print(f"ERROR: File not found: {p}")
             sys.exit(1)
 
     out_dir.mkdir(parents=True, exist_ok=True)
+    output_options = (args.output_format or "json", bool(args.gzip))
 
-    print("Parsing performance data...")
-    perf_data = parse_performance_csv(perf_csv)
-
-    print("Parsing memory data...")
-    mem_data = parse_memory_csv(mem_csv)
-
-    print("Building graph...")
-    graph = build_graph(perf_data, mem_data)
-
-    output_file = out_dir / "performance-tracking2.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(graph, f, indent=2)
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
 
-    print(
-        f"Success! Generated {len(graph['nodes'])} nodes and {len(graph['edges'])} edges")
+    store = run = None
+    if args.store:
+        store = HotspotStore(args.store)
+        run = store.begin_run(timestamp)
+
+    if args.baseline:
+        print("Comparing candidate run against baseline...")
+        baseline_items = join_profiles(*args.baseline, packages, timestamp)
+        candidate_items = join_profiles(perf_csv, mem_csv, packages, timestamp)
+        if run is not None:
+            candidate_items = run.observe(candidate_items)
+        regressions = compare_profiles(baseline_items, candidate_items, thresholds)
+
+        output_file = out_dir / output_path("performance-regressions", *output_options)
+        writer = GraphWriter(output_file, "HotSpotRegression", *output_options)
+        node_count, edge_count = write_regressions(regressions, writer, timestamp)
+        result = f"Found {edge_count} regressed methods"
+    else:
+        print("Joining performance and memory data...")
+        stats = RunStats(args.metric)
+        items = stats.observe(join_profiles(perf_csv, mem_csv, packages, timestamp))
+        summary_props = {}
+        if run is not None:
+            items = run.observe(items)
+
+        if args.top_k is not None:
+            items = select_top_k(items, args.top_k, args.metric)
+            summary_props = {"selected_by": args.metric, "top_k": args.top_k}
+        elif args.percentile is not None:
+            # The cut-off is only known once every value has been seen, so the
+            # joined records of the one pass are kept to pick those above it.
+            joined = list(items)
+            cutoff = stats.metric_percentile(args.percentile)
+            items = (item for item in joined if item.get(args.metric, 0) >= cutoff)
+            summary_props = {"selected_by": args.metric, "percentile": args.percentile,
+                             "cutoff": cutoff}
+
+        output_file = out_dir / output_path("performance-tracking2", *output_options)
+        writer = GraphWriter(output_file, "HotSpot", *output_options)
+        node_count, edge_count = write_graph(
+            items, writer, lambda: stats.summary_node(timestamp, summary_props))
+        result = f"Generated {node_count} nodes and {edge_count} edges"
+
+    if store is not None:
+        record = run.commit()
+        print(f"Appended run {record['run']} ({record['rows']} methods) to {args.store}")
+
+    print(f"Success! {result}")
     print(f"Output saved to: {output_file.resolve()}")
 
 
@@ -0,0 +1,6 @@
+"""
+Code shared by the Probe-Hub probes.
+
+The probes stay standalone scripts; each one puts the repository root on
+sys.path and imports what it needs from here.
+"""
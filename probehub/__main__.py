@@ -0,0 +1,25 @@
+"""
+Command-line entry point: python -m probehub COMMAND ...
+
+    run      run several probes over one project (probehub.run)
+    upload   upload probe outputs to SST in batches (probehub.upload)
+"""
+import sys
+
+COMMANDS = ("run", "upload")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(__doc__.strip())
+        return 0 if argv[:1] in (["-h"], ["--help"]) else 2
+    if argv[0] == "run":
+        from probehub.run import main as command
+    else:
+        from probehub.upload import main as command
+    return command(argv[1:])
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,229 @@
+"""
+Streaming writer for the {"probeName", "nodes", "edges"} documents every
+probe produces for SST.
+
+Nodes and edges are written as they are produced instead of being collected
+and json.dump-ed at the end, so peak memory no longer grows with the graph.
+Two layouts are supported, each optionally gzip-compressed:
+
+    json     one compact JSON document. Nodes go straight to the output;
+             edges are spooled to a temporary file and appended after them.
+    ndjson   one JSON object per line: a {"probeName": ...} header, then
+             {"node": {...}} and {"edge": {...}} lines in production order.
+
+Nodes are deduplicated on the fly by (type, identifying property), so a
+probe may emit the same Method node many times and it is written once.
+
+read_graph() streams either layout back as ("node", ...) / ("edge", ...)
+pairs, all nodes first, for tools such as the uploader that consume probe
+outputs.
+"""
+import gzip
+import json
+import re
+import shutil
+import tempfile
+
+OUTPUT_FORMATS = ("json", "ndjson")
+# Property SST identifies a node by, in order of preference
+NODE_KEY_PROPERTIES = ("fullName", "id", "uid", "fileName", "name")
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def node_key(node):
+    for prop in NODE_KEY_PROPERTIES:
+        if prop in node:
+            return node.get("type"), prop, node[prop]
+    return None
+
+
+def detect_format(path, fmt=None, compress=None):
+    """(format, compress) from explicit choices, else from the file name."""
+    name = str(path).lower()
+    if compress is None:
+        compress = name.endswith(".gz")
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if fmt is None:
+        fmt = "ndjson" if name.endswith((".ndjson", ".jsonl")) else "json"
+    return fmt, compress
+
+
+def output_path(base, fmt="json", compress=False):
+    """File name for an output whose name the probe chooses itself."""
+    return f"{base}.{fmt}{'.gz' if compress else ''}"
+
+
+class GraphWriter:
+    def __init__(self, path, probe_name, fmt=None, compress=None, dedupe=True):
+        self.path = str(path)
+        self.fmt, self.compress = detect_format(path, fmt, compress)
+        if self.fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"unknown output format: {self.fmt}")
+        if self.compress:
+            self._out = gzip.open(self.path, "wt", encoding="utf-8")
+        else:
+            self._out = open(self.path, "w", encoding="utf-8")
+        self._keys = set() if dedupe else None
+        self.node_count = self.edge_count = self.duplicate_count = 0
+
+        if self.fmt == "json":
+            self._edges = tempfile.TemporaryFile("w+", encoding="utf-8")
+            self._out.write('{"probeName":%s,"nodes":[' % _dumps(probe_name))
+        else:
+            self._edges = None
+            self._out.write(_dumps({"probeName": probe_name}) + "\n")
+
+    def add_node(self, node):
+        """Write a node unless one with the same key was already written; returns whether it was."""
+        if self._keys is not None:
+            key = node_key(node)
+            if key is not None:
+                if key in self._keys:
+                    self.duplicate_count += 1
+                    return False
+                self._keys.add(key)
+        if self.fmt == "json":
+            self._out.write(("," if self.node_count else "") + _dumps(node))
+        else:
+            self._out.write('{"node":%s}\n' % _dumps(node))
+        self.node_count += 1
+        return True
+
+    def add_edge(self, edge):
+        if self.fmt == "json":
+            self._edges.write(("," if self.edge_count else "") + _dumps(edge))
+        else:
+            self._out.write('{"edge":%s}\n' % _dumps(edge))
+        self.edge_count += 1
+
+    def add_nodes(self, nodes):
+        for node in nodes:
+            self.add_node(node)
+
+    def add_edges(self, edges):
+        for edge in edges:
+            self.add_edge(edge)
+
+    def write_items(self, items):
+        """Write ("node", node) / ("edge", edge) pairs in the order they come."""
+        for kind, item in items:
+            if kind == "node":
+                self.add_node(item)
+            else:
+                self.add_edge(item)
+
+    def write_graph(self, graph):
+        """Write the nodes and edges of an already built graph dict."""
+        self.add_nodes(graph.get("nodes", ()))
+        self.add_edges(graph.get("edges", ()))
+
+    def close(self):
+        if self._out.closed:
+            return
+        if self.fmt == "json":
+            self._out.write('],"edges":[')
+            self._edges.seek(0)
+            shutil.copyfileobj(self._edges, self._out)
+            self._edges.close()
+            self._out.write("]}\n")
+        self._out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_text(path):
+    if str(path).lower().endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_json_array(path: str, key: str, chunk_size: int = 1 << 16):
+    """
+    Elements of the first `"key": [...]` array of a JSON document, decoded
+    one at a time from a growing read buffer instead of json.load-ing the
+    whole document. Gzip-compressed files (*.gz) are read transparently.
+    """
+    decoder = json.JSONDecoder()
+    start_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    with open_text(path) as f:
+        buf = ""
+        while True:
+            m = start_re.search(buf)
+            if m:
+                buf, pos = buf[m.end():], 0
+                break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf = buf[-256:] + chunk
+
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos == len(buf):
+                    raise ValueError("need more data")
+                obj, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                chunk = f.read(max(chunk_size, len(buf) - pos))
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield obj
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def read_graph(path, fmt=None):
+    """(probeName, iterator of (kind, item) pairs) of a graph file in either layout."""
+    fmt, _ = detect_format(path, fmt)
+    if fmt == "ndjson":
+        with open_text(path) as f:
+            probe_name = json.loads(f.readline()).get("probeName")
+        # two passes, so nodes come before edges as they do in the json layout
+        items = ((kind, item) for kind in ("node", "edge") for item in _iter_ndjson(path, kind))
+        return probe_name, items
+
+    with open_text(path) as f:
+        head = f.read(4096)
+    m = re.search(r'"probeName"\s*:\s*("(?:[^"\\]|\\.)*")', head)
+    probe_name = json.loads(m.group(1)) if m else None
+    items = ((kind, item) for kind, key in (("node", "nodes"), ("edge", "edges"))
+             for item in iter_json_array(path, key))
+    return probe_name, items
+
+
+def _iter_ndjson(path, kind):
+    """The `kind` ("node" or "edge") objects of an ndjson graph, in file order."""
+    other = '{"%s":' % ("edge" if kind == "node" else "node")
+    with open_text(path) as f:
+        f.readline()
+        for line in f:
+            # GraphWriter's own lines are told apart without decoding them
+            if line.startswith(other) or not line.strip():
+                continue
+            obj = json.loads(line)
+            if kind in obj:
+                yield obj[kind]
+
+
+def add_output_arguments(parser):
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS,
+                        help="json (one compact document) or ndjson (one node/edge per line); "
+                             "default: from the output file extension, else json")
+    parser.add_argument("--gzip", action="store_true", default=None,
+                        help="gzip-compress the output (implied by a .gz output file name)")
+
+
+def open_graph(path, probe_name, args):
+    """GraphWriter configured from the add_output_arguments options."""
+    return GraphWriter(path, probe_name, args.output_format, args.gzip)
@@ -0,0 +1,197 @@
+"""
+Reading Java sources without parsing them: the package and import
+declarations of a file's header, and the .java files of a source tree.
+
+When several probes run over the same tree (`python -m probehub run`), the
+tree is walked once into a SourceTree and shared with share_tree(). The
+helpers below then list files from that walk and read contents from its
+cache instead of the file system; without a shared tree they fall back to
+os.walk and open.
+"""
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+COMMENT_START_RE = re.compile(r'/\*|//')
+HEADER_KEYWORD_RE = re.compile(r'(package|import)\b')
+# Comments and literals match with an empty group, so only identifiers in code are kept
+TYPE_TOKEN_RE = re.compile(r'//[^\n]*|/\*.*?(?:\*/|$)|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|\b([A-Z][\w$]*)',
+                           re.S)
+
+
+def strip_comments(line, in_comment):
+    """(code of one line without comments, whether a block comment is still open)."""
+    code = []
+    i = 0
+    while i < len(line):
+        if in_comment:
+            end = line.find('*/', i)
+            if end < 0:
+                return ' '.join(code), True
+            i, in_comment = end + 2, False
+            continue
+        m = COMMENT_START_RE.search(line, i)
+        if not m:
+            code.append(line[i:])
+            break
+        code.append(line[i:m.start()])
+        if m.group() == '//':
+            break
+        i, in_comment = m.end(), True
+    return ' '.join(code), in_comment
+
+
+def scan_header(file_path, body=False):
+    """
+    (package, imports, static imports, identifiers) of a Java file, reading
+    only the header: scanning stops at the first statement that is neither a
+    package nor an import declaration, i.e. at the first type declaration or
+    its annotations. Static imports are recorded without the `static`
+    keyword (also in `imports`), wildcard imports keep their trailing `.*`.
+
+    With `body` the rest of the file is read too and `identifiers` is the
+    set of capitalised identifiers outside comments and literals, i.e. the
+    candidate type names it references; otherwise it is None.
+    """
+    package_name = None
+    imports, static_imports = set(), set()
+    statement = ''
+    in_comment = False
+
+    with open_source(file_path) as f:
+        for line in f:
+            code, in_comment = strip_comments(line, in_comment)
+            statement = f"{statement} {code}" if statement else code
+            while True:
+                head = statement.lstrip()
+                if head and not HEADER_KEYWORD_RE.match(head):
+                    identifiers = None
+                    if body:
+                        rest = ('/*' if in_comment else '') + head + f.read()
+                        identifiers = {m for m in TYPE_TOKEN_RE.findall(rest) if m}
+                    return package_name, imports, static_imports, identifiers
+                if ';' not in head:
+                    statement = head
+                    break
+                decl, _, statement = head.partition(';')
+                keyword, *parts = decl.split()
+                if keyword == 'package':
+                    package_name = ''.join(parts)
+                    continue
+                if parts and parts[0] == 'static':
+                    name = ''.join(parts[1:])
+                    static_imports.add(name)
+                else:
+                    name = ''.join(parts)
+                if name:
+                    imports.add(name)
+
+    return package_name, imports, static_imports, set() if body else None
+
+
+def java_files_under(source_directory):
+    return source_files(source_directory, '.java')
+
+
+class SourceTree:
+    """
+    Every file under `root`, walked once in os.walk order with sorted
+    directories and names, and a cache of file contents. Contents are kept as
+    bytes so every reader decodes them the way it would decode the file.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = []
+        for dir_path, dirs, files in os.walk(self.root):
+            dirs.sort()
+            self.files.extend(os.path.join(dir_path, f) for f in sorted(files))
+        self._contents = {}
+        self._lock = threading.Lock()
+
+    def covers(self, path):
+        path = os.path.abspath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def files_under(self, directory, suffix=None):
+        directory = os.path.abspath(directory)
+        prefix = directory + os.sep
+        return [p for p in self.files
+                if p.startswith(prefix) and (suffix is None or p.endswith(suffix))]
+
+    def read_bytes(self, path):
+        path = os.path.abspath(path)
+        data = self._contents.get(path)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            with self._lock:
+                self._contents[path] = data
+        return data
+
+    def preload(self, suffix='.java', threads=8):
+        """Read every file ending in `suffix` into the cache; returns the bytes read."""
+        paths = [p for p in self.files if p.endswith(suffix) and p not in self._contents]
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+            return sum(map(len, pool.map(self.read_bytes, paths)))
+
+    def __getstate__(self):
+        return {"root": self.root, "files": self.files, "_contents": self._contents}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+_SHARED_TREES = []
+
+
+def share_tree(tree):
+    """Serve listings and reads under tree.root from `tree` in this process."""
+    if all(t.root != tree.root for t in _SHARED_TREES):
+        _SHARED_TREES.append(tree)
+
+
+def shared_tree(path):
+    for tree in _SHARED_TREES:
+        if tree.covers(path):
+            return tree
+    return None
+
+
+def source_files(directory, suffix=None):
+    """Paths of the files under directory (optionally ending in suffix), spelled relative to it."""
+    tree = shared_tree(directory)
+    if tree is not None:
+        base = os.path.abspath(directory)
+        return [os.path.join(directory, os.path.relpath(p, base))
+                for p in tree.files_under(base, suffix)]
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, f) for f in sorted(files)
+                     if suffix is None or f.endswith(suffix))
+    return paths
+
+
+def read_source_bytes(path):
+    tree = shared_tree(path)
+    if tree is not None:
+        return tree.read_bytes(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def read_source(path, errors='strict'):
+    """A file's text, with newlines translated as open() in text mode does."""
+    text = read_source_bytes(path).decode('utf-8', errors)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def open_source(path, errors='replace'):
+    """Text stream over a file's contents, from the shared cache when there is one."""
+    if shared_tree(path) is not None:
+        return io.StringIO(read_source(path, errors))
+    return open(path, 'r', encoding='utf-8', errors=errors)
@@ -0,0 +1,218 @@
+"""
+Fully qualified type and method names shared by every probe.
+
+Probes see type names in many spellings: simple names from source code and
+PMD messages, dotted names from profilers, generics, varargs. SST only joins
+a Method node from one probe with the same method from another when both
+spell its fullName identically, so every probe qualifies names here:
+
+    pkg.Cls.method(fq.Type1,fq.Type2[])
+
+Parameter types are erased (no generic arguments), varargs become arrays
+and a simple name, or the outer name of a nested one such as Map.Entry,
+resolves, in order, through
+
+    1. single-type imports of the declaring file
+    2. the project's own types in the same package
+    3. on-demand (`.*`) imports of project packages
+    4. a table of well-known JDK and framework types
+    5. the declaring package, as a last resort
+
+The project's packages and imports come from a SymbolTable built once from
+the source tree. Both resolution steps are memoized in bounded LRU caches.
+"""
+import os
+from functools import lru_cache
+
+from probehub.javasource import java_files_under, scan_header
+
+PRIMITIVE_TYPES = frozenset({
+    "boolean", "byte", "char", "short", "int", "long", "float", "double", "void"
+})
+
+WELL_KNOWN_TYPES = {}
+for _package, _names in (
+        ("java.lang", "Boolean Byte Character Short Integer Long Float Double Number Void "
+                      "String StringBuilder CharSequence Object Class ClassLoader Enum "
+                      "Iterable Runnable Thread Throwable Exception RuntimeException"),
+        ("java.util", "Collection List ArrayList LinkedList Map HashMap LinkedHashMap TreeMap "
+                      "Set HashSet LinkedHashSet TreeSet Iterator Optional Date Calendar "
+                      "Locale UUID"),
+        ("java.time", "LocalDate LocalDateTime LocalTime Instant Duration Period"),
+        ("org.springframework.ui", "Model"),
+        ("org.springframework.validation", "BindingResult Errors"),
+        ("org.springframework.data.domain", "Page Pageable"),
+        ("org.springframework.web.servlet.mvc.support", "RedirectAttributes"),
+        ("javax.servlet.http", "HttpServletRequest HttpServletResponse"),
+):
+    WELL_KNOWN_TYPES.update((name, f"{_package}.{name}") for name in _names.split())
+
+
+def erase(type_name):
+    """'Map<K, List<V>>' -> 'Map', 'String...' -> 'String[]', whitespace dropped."""
+    out, depth = [], 0
+    for ch in type_name:
+        if ch == "<":
+            depth += 1
+        elif ch == ">":
+            depth -= 1
+        elif depth == 0 and not ch.isspace():
+            out.append(ch)
+    erased = "".join(out)
+    if erased.endswith("..."):
+        erased = erased[:-3] + "[]"
+    return erased
+
+
+def parameter_type(param):
+    """
+    Type of a javalang FormalParameter as written in source, without
+    generics: 'Map.Entry', 'java.util.Date[]', 'String...' for varargs.
+    """
+    parts, node = [], param.type
+    while node is not None:
+        parts.append(node.name)
+        node = getattr(node, "sub_type", None)
+    name = ".".join(parts) + "[]" * len(param.type.dimensions or [])
+    return name + "..." if getattr(param, "varargs", False) else name
+
+
+def split_params(params):
+    """Split a parameter list on the commas that are not inside generic arguments."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(params):
+        if ch == "<":
+            depth += 1
+        elif ch == ">":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(params[start:i])
+            start = i + 1
+    parts.append(params[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def package_of(class_name):
+    """Leading lower-case segments of a dotted class name: 'a.b.C$D' -> 'a.b'."""
+    segments = class_name.split(".")
+    package = []
+    for segment in segments[:-1]:
+        if segment[:1].isupper():
+            break
+        package.append(segment)
+    return ".".join(package) or None
+
+
+def top_level_class(class_name):
+    """'a.b.Outer$Inner' / 'a.b.Outer.Inner' -> 'a.b.Outer'."""
+    class_name = class_name.split("$", 1)[0]
+    package = package_of(class_name)
+    rest = class_name[len(package) + 1:] if package else class_name
+    outer = rest.split(".", 1)[0]
+    return f"{package}.{outer}" if package else outer
+
+
+class SymbolTable:
+    """
+    The project's own types and the imports of the file declaring each of
+    them, built once from package/import declarations. Plain dicts, so it
+    pickles cheaply into worker processes.
+    """
+
+    def __init__(self):
+        self.packages = {}   # package -> set of simple type names
+        self.imports = {}    # top-level type fqn -> tuple of imports
+
+    def add(self, package, type_name, imports=()):
+        self.packages.setdefault(package or "", set()).add(type_name)
+        fqn = f"{package}.{type_name}" if package else type_name
+        self.imports[fqn] = tuple(sorted(imports))
+
+    def has(self, package, type_name):
+        return type_name in self.packages.get(package or "", ())
+
+    def imports_of(self, class_name):
+        return self.imports.get(top_level_class(class_name), ())
+
+    @classmethod
+    def from_sources(cls, source_dir, java_files=None):
+        """Symbols of every .java file under source_dir (or of the given files), headers only."""
+        table = cls()
+        for path in java_files if java_files is not None else java_files_under(source_dir):
+            try:
+                package, imports, _, _ = scan_header(path)
+            except OSError as e:
+                print(f"[WARN] Cannot read {path}: {e}")
+                continue
+            table.add(package, os.path.splitext(os.path.basename(path))[0], imports)
+        return table
+
+
+class TypeResolver:
+    def __init__(self, symbols=None, cache_size=65536):
+        self.symbols = symbols or SymbolTable()
+        self.cache_size = cache_size
+        self._memoize()
+
+    def _memoize(self):
+        self.qualify_type = lru_cache(maxsize=self.cache_size)(self._qualify_type)
+        self.qualify_signature = lru_cache(maxsize=self.cache_size)(self._qualify_signature)
+
+    def __getstate__(self):
+        return {"symbols": self.symbols, "cache_size": self.cache_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memoize()
+
+    def _qualify_type(self, type_name, package=None, imports=()):
+        """Fully qualified, erased form of one type as written in `package` with `imports`."""
+        name = erase(type_name)
+        base = name.rstrip("[]")
+        dims = name[len(base):]
+        if not base or base in PRIMITIVE_TYPES:
+            return name
+        # 'Map.Entry' qualifies its outer type; 'java.util.Date' already is qualified
+        outer, dot, nested = base.partition(".")
+        if dot and not outer[:1].isupper():
+            return name
+        nested = dot + nested + dims
+
+        suffix = "." + outer
+        for imp in imports:
+            if imp.endswith(suffix):
+                return imp + nested
+        if package and self.symbols.has(package, outer):
+            return f"{package}.{outer}{nested}"
+        for imp in imports:
+            if imp.endswith(".*") and self.symbols.has(imp[:-2], outer):
+                return f"{imp[:-2]}.{outer}{nested}"
+        if outer in WELL_KNOWN_TYPES:
+            return WELL_KNOWN_TYPES[outer] + nested
+        if package:
+            return f"{package}.{outer}{nested}"
+        return name
+
+    def _qualify_signature(self, signature, package=None, imports=None):
+        """
+        'a.b.C.m(int, String, List<X>)' -> 'a.b.C.m(int,java.lang.String,java.util.List)'.
+        The package and imports default to those of the declaring class.
+        Strings without a parameter list are returned unchanged.
+        """
+        name, paren, rest = signature.partition("(")
+        if not paren:
+            return signature
+        name = "".join(name.split())
+        params, _, _ = rest.rpartition(")")
+        owner = name.rpartition(".")[0]
+        if package is None:
+            package = package_of(owner) if "." in owner else None
+        if imports is None:
+            imports = self.symbols.imports_of(owner)
+        qualified = [self.qualify_type(p, package, imports) for p in split_params(params)]
+        return f"{name}({','.join(qualified)})"
+
+    def method_name(self, class_fqn, method, param_types, package=None, imports=()):
+        """fullName of a method from its parts, e.g. as read from a parsed source file."""
+        params = ",".join(self.qualify_type(t, package, tuple(imports)) for t in param_types)
+        return f"{class_fqn}.{method}({params})"
@@ -0,0 +1,279 @@
+"""
+Run several probes over one project in a single command.
+
+    python -m probehub run PROJECT_ROOT [--probes complexity,dependency,...]
+
+The source tree is walked once and, unless --no-content-cache is given, all
+its .java files are read once into a SourceTree that every probe lists and
+reads through (see probehub.javasource). The probes then run concurrently:
+
+    complexity, changes        parse Java with javalang, so each gets a
+                               process of its own (changes also switches
+                               to the git root, which must not leak into
+                               the other probes)
+    dependency, calls, hotspot read headers, POMs and profiler CSVs, so
+                               they share the parent process as threads
+
+Worker processes are forked after the tree is loaded and inherit it; where
+fork is not available it is handed to them once. Every probe streams its
+graph straight to the output directory and writes its log to
+logs/<probe>.log there; the run ends with each probe's wall time.
+"""
+import argparse
+import importlib.util
+import os
+import shlex
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from probehub.graphwriter import add_output_arguments, output_path
+from probehub.javasource import SourceTree, share_tree
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> script, how it runs, base name of its output
+PROBES = {
+    "complexity": ("complexityAnalysis/complexity analyzer.py", "process", "pmd_cyclomatic"),
+    "changes": ("frequentChange/frequentChange.py", "process", "changespot"),
+    "dependency": ("dependecyAnalyzer/dependency-analyzer.py", "thread", "dependencies"),
+    "calls": ("dynamicCallStack/dynamicCall.py", "thread", "dynamic-calls"),
+    "hotspot": ("performanceHotspot/performance-hotspot.py", "thread", "performance-tracking2"),
+}
+
+
+class ThreadOutput:
+    """sys.stdout/sys.stderr stand-in that sends each thread's writes to its own file."""
+
+    def __init__(self, default):
+        self.default = default
+        self.targets = {}
+
+    def write(self, text):
+        return self.targets.get(threading.get_ident(), self.default).write(text)
+
+    def flush(self):
+        self.targets.get(threading.get_ident(), self.default).flush()
+
+
+def load_probe(name):
+    script = os.path.join(REPO_ROOT, PROBES[name][0])
+    script_dir = os.path.dirname(script)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)  # sibling modules such as pom_resolver
+    spec = importlib.util.spec_from_file_location(f"probehub_{name}", script)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # lets the probe's own worker processes unpickle its functions
+    spec.loader.exec_module(module)
+    return module
+
+
+def capture_output():
+    """Route this process's stdout/stderr through ThreadOutput; returns the previous streams."""
+    streams = sys.stdout, sys.stderr
+    if not isinstance(sys.stdout, ThreadOutput):
+        sys.stdout, sys.stderr = ThreadOutput(sys.stdout), ThreadOutput(sys.stderr)
+    return streams
+
+
+def init_worker(tree):
+    share_tree(tree)
+    capture_output()
+
+
+def run_probe(name, argv, log_path):
+    """Worker: run one probe's main(argv) with its output going to log_path; (ok, seconds)."""
+    ident = threading.get_ident()
+    started = time.perf_counter()
+    ok = True
+    with open(log_path, "w", encoding="utf-8") as log:
+        sys.stdout.targets[ident] = sys.stderr.targets[ident] = log
+        print(f"$ {PROBES[name][0]} {shlex.join(argv)}")
+        try:
+            load_probe(name).main(argv)
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except Exception:
+            traceback.print_exc()
+            ok = False
+        finally:
+            del sys.stdout.targets[ident], sys.stderr.targets[ident]
+    return ok, time.perf_counter() - started
+
+
+def probe_argv(name, args, output):
+    """Command line of one probe for this run."""
+    fmt = []
+    if args.output_format:
+        fmt += ["--output-format", args.output_format]
+    if args.gzip:
+        fmt.append("--gzip")
+    extra = shlex.split(args.probe_args.get(name, ""))
+
+    if name == "complexity":
+        if args.pmd_report:
+            source = [args.pmd_report, args.src]
+        else:
+            source = [args.src, "--native", "-j", str(args.jobs)]
+        return source + ["-o", output] + fmt + extra
+    if name == "changes":
+        return ["--src", args.src, "--out", output, "--git-root", args.git_root,
+                "--jobs", str(args.jobs)] + fmt + extra
+    if name == "dependency":
+        return [args.pom, args.src, "-o", output, "--threads", str(args.threads)] + fmt + extra
+    if name == "calls":
+        return args.profile + ["-o", output, "--source", args.src] + fmt + extra
+    return [args.perf, args.mem, os.path.dirname(output), "--source", args.src] + fmt + extra
+
+
+def available_probes(args):
+    """Probes whose inputs this run has, with the reason for each one that is missing."""
+    missing = {}
+    if not args.pmd_report and importlib.util.find_spec("javalang") is None:
+        missing["complexity"] = "needs --pmd-report or javalang installed"
+    if importlib.util.find_spec("javalang") is None:
+        missing["changes"] = "needs javalang installed"
+    elif not os.path.exists(os.path.join(args.git_root, ".git")):
+        missing["changes"] = f"{args.git_root} is not a git repository (see --git-root)"
+    if not os.path.isfile(args.pom):
+        missing["dependency"] = f"no {args.pom} (see --pom)"
+    if not args.profile:
+        missing["calls"] = "needs --profile"
+    if not (args.perf and args.mem):
+        missing["hotspot"] = "needs --perf and --mem"
+    return [name for name in PROBES if name not in missing], missing
+
+
+def parse_probe_args(value):
+    name, sep, probe_args = value.partition("=")
+    if not sep or name not in PROBES:
+        raise argparse.ArgumentTypeError(f"expected PROBE=ARGS with PROBE one of {', '.join(PROBES)}")
+    return name, probe_args
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m probehub run",
+        description="Run several probes over one Java project, sharing one walk of its sources.")
+    parser.add_argument("project", help="Project root")
+    parser.add_argument("--probes",
+                        help=f"Comma-separated probes to run: {', '.join(PROBES)} "
+                             "(default: every probe whose inputs are available)")
+    parser.add_argument("-o", "--output-dir", default="probe-output",
+                        help="Directory the graphs and logs are written to (default: probe-output)")
+    parser.add_argument("--src", help="Java source root (default: PROJECT/src/main/java)")
+    parser.add_argument("--pom", help="pom.xml for the dependency probe (default: PROJECT/pom.xml)")
+    parser.add_argument("--git-root", help="Git repository root for the changes probe (default: PROJECT)")
+    parser.add_argument("--pmd-report",
+                        help="PMD report for the complexity probe (default: compute it natively)")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="CSV",
+                        help="Profiler call-tree CSVs or folded stacks for the calls probe")
+    parser.add_argument("--perf", help="YourKit CPU/time CSV for the hotspot probe")
+    parser.add_argument("--mem", help="YourKit memory CSV for the hotspot probe")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes inside each of complexity and changes (default: 1)")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Threads reading sources, for the shared cache and the dependency probe "
+                             "(default: 8)")
+    parser.add_argument("--no-content-cache", action="store_true",
+                        help="Share only the directory walk; every probe reads files itself")
+    parser.add_argument("--probe-args", type=parse_probe_args, action="append", default=[],
+                        metavar="PROBE=ARGS",
+                        help='Extra arguments for one probe, e.g. dependency="--transitive --internal" '
+                             "(repeatable)")
+    add_output_arguments(parser)
+
+    args = parser.parse_args(argv)
+    project = os.path.abspath(args.project)
+    args.src = os.path.abspath(args.src or os.path.join(project, "src", "main", "java"))
+    args.pom = os.path.abspath(args.pom or os.path.join(project, "pom.xml"))
+    args.git_root = os.path.abspath(args.git_root or project)
+    args.profile = [os.path.abspath(p) for p in args.profile]
+    args.perf = args.perf and os.path.abspath(args.perf)
+    args.mem = args.mem and os.path.abspath(args.mem)
+    args.probe_args = dict(args.probe_args)
+    if not os.path.isdir(args.src):
+        parser.error(f"source root not found: {args.src} (see --src)")
+
+    selected, missing = available_probes(args)
+    if args.probes:
+        names = [n.strip() for n in args.probes.split(",") if n.strip()]
+        unknown = [n for n in names if n not in PROBES]
+        if unknown:
+            parser.error(f"unknown probes: {', '.join(unknown)} (choose from {', '.join(PROBES)})")
+        for name in names:
+            if name in missing:
+                parser.error(f"cannot run {name}: {missing[name]}")
+        selected = [name for name in PROBES if name in names]
+    else:
+        for name, reason in missing.items():
+            print(f"[INFO] Skipping {name}: {reason}")
+    if not selected:
+        parser.error("no probe to run")
+
+    out_dir = os.path.abspath(args.output_dir)
+    os.makedirs(os.path.join(out_dir, "logs"), exist_ok=True)
+    fmt = args.output_format or "json"
+    outputs = {name: os.path.join(out_dir, output_path(PROBES[name][2], fmt, bool(args.gzip)))
+               for name in selected}
+
+    run_started = time.perf_counter()
+    tree = SourceTree(args.src)
+    java_count = sum(f.endswith(".java") for f in tree.files)
+    print(f"[INFO] Walked {args.src}: {len(tree.files)} files, {java_count} Java "
+          f"({time.perf_counter() - run_started:.2f}s)")
+    if not args.no_content_cache:
+        started = time.perf_counter()
+        size = tree.preload(".java", args.threads)
+        print(f"[INFO] Cached {java_count} Java sources, {size / 1e6:.1f} MB "
+              f"({time.perf_counter() - started:.2f}s)")
+    share_tree(tree)
+
+    in_processes = [n for n in selected if PROBES[n][1] == "process"]
+    in_threads = [n for n in selected if PROBES[n][1] == "thread"]
+    print(f"[INFO] Running {', '.join(selected)}")
+
+    futures = {}
+    processes = threads = streams = None
+    try:
+        # start the processes first, so they fork before any probe thread exists
+        if in_processes:
+            processes = ProcessPoolExecutor(max_workers=len(in_processes),
+                                            initializer=init_worker, initargs=(tree,))
+            for name in in_processes:
+                futures[name] = processes.submit(run_probe, name,
+                                                 probe_argv(name, args, outputs[name]),
+                                                 os.path.join(out_dir, "logs", f"{name}.log"))
+        if in_threads:
+            streams = capture_output()
+            threads = ThreadPoolExecutor(max_workers=len(in_threads))
+            for name in in_threads:
+                futures[name] = threads.submit(run_probe, name,
+                                               probe_argv(name, args, outputs[name]),
+                                               os.path.join(out_dir, "logs", f"{name}.log"))
+
+        results = {}
+        for name in selected:
+            try:
+                results[name] = futures[name].result()
+            except Exception as e:  # e.g. a worker process that died
+                print(f"[ERROR] {name}: {e}")
+                results[name] = (False, None)
+    finally:
+        for pool in (threads, processes):
+            if pool is not None:
+                pool.shutdown()
+        if streams is not None:
+            sys.stdout, sys.stderr = streams
+
+    print()
+    print(f"{'Probe':<12}{'Mode':<9}{'Status':<8}{'Wall time':>10}  Output")
+    for name in selected:
+        ok, seconds = results[name]
+        wall = f"{seconds:.2f}s" if seconds is not None else "-"
+        shown = outputs[name] if ok else os.path.join(out_dir, "logs", f"{name}.log")
+        print(f"{name:<12}{PROBES[name][1]:<9}{'ok' if ok else 'failed':<8}{wall:>10}  {shown}")
+    print(f"Total wall time: {time.perf_counter() - run_started:.2f}s")
+    return 0 if all(ok for ok, _ in results.values()) else 1
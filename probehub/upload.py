@@ -0,0 +1,378 @@
+"""
+Upload probe graphs to an SST server in batches.
+
+Instead of importing one large JSON document per probe, the nodes and edges
+of a graph file (any layout GraphWriter produces) are streamed from disk and
+POSTed in batches. Every batch is a small graph document of its own:
+
+    {"probeName": "...", "nodes": [...], "edges": [...]}
+
+All node batches are sent before the first edge batch, so every edge's
+endpoints already exist when it arrives. Requests go over persistent HTTP/1.1
+connections, one per worker thread, and at most --concurrency batches are
+in flight at a time. A batch is acknowledged by any 2xx response; 408, 429,
+5xx answers and connection errors are retried with exponential backoff
+(honouring Retry-After), other statuses abort the upload.
+
+Progress is recorded in --cache-dir as the number of leading batches that
+were all acknowledged. When an upload is interrupted, running it again with
+the same file, URL and batch size resumes after that point. Batches past it
+that were acknowledged may be sent again, so the server is expected to
+merge nodes by their identifying property.
+
+    python -m probehub.upload send graph.json [more.ndjson.gz ...] --url URL
+    python -m probehub.upload stub --port 8080 [--fail-rate 0.1]
+
+`stub` runs a local stand-in server that accepts the batches, optionally
+fails some of them, and reports what it received.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import signal
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from probehub.graphwriter import read_graph
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "probe-hub")
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+class UploadError(Exception):
+    pass
+
+
+def iter_batches(items, batch_size):
+    """(kind, [item, ...]) batches of at most batch_size items of one kind, in order."""
+    for kind, group in itertools.groupby(items, key=lambda pair: pair[0]):
+        group = (item for _, item in group)
+        while True:
+            batch = list(itertools.islice(group, batch_size))
+            if not batch:
+                break
+            yield kind, batch
+
+
+class UploadState:
+    """
+    Acknowledged-batch watermark per (file, URL). An entry only applies while
+    the file's size and mtime and the batch size are unchanged.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                path       TEXT NOT NULL,
+                url        TEXT NOT NULL,
+                size       INTEGER NOT NULL,
+                mtime_ns   INTEGER NOT NULL,
+                batch_size INTEGER NOT NULL,
+                acked      INTEGER NOT NULL,
+                PRIMARY KEY (path, url)
+            )
+        """)
+
+    def acked(self, path, url, stat, batch_size):
+        row = self.conn.execute(
+            "SELECT acked FROM uploads WHERE path = ? AND url = ? AND size = ? "
+            "AND mtime_ns = ? AND batch_size = ?",
+            (path, url, stat.st_size, stat.st_mtime_ns, batch_size)).fetchone()
+        return row[0] if row else 0
+
+    def save(self, path, url, stat, batch_size, acked):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+                              (path, url, stat.st_size, stat.st_mtime_ns, batch_size, acked))
+
+    def forget(self, path, url):
+        with self.conn:
+            self.conn.execute("DELETE FROM uploads WHERE path = ? AND url = ?", (path, url))
+
+    def close(self):
+        self.conn.close()
+
+
+class Uploader:
+    def __init__(self, url, concurrency=4, retries=5, backoff=0.5, timeout=60.0, headers=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http(s) URL: {url}")
+        self.url = url
+        self.scheme, self.host, self.port = parts.scheme, parts.hostname, parts.port
+        self.target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self._local = threading.local()
+        # one pool for the uploader's lifetime, so its connections outlive a single file
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.requests = self.retried = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def post(self, body, index):
+        """POST one batch until it is acknowledged; raises UploadError when it never is."""
+        headers = {**self.headers, "X-Probe-Batch": str(index)}
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                conn = self._connection()
+                conn.request("POST", self.target, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()  # drain, so the connection can be reused
+                with self._lock:
+                    self.requests += 1
+                if 200 <= response.status < 300:
+                    return
+                if response.status not in RETRY_STATUSES:
+                    raise UploadError(f"batch {index}: HTTP {response.status} {response.reason}")
+                problem = f"HTTP {response.status}"
+                retry_after = response.getheader("Retry-After")
+                if response.will_close:
+                    self._drop_connection()
+            except (OSError, http.client.HTTPException) as e:
+                problem = f"{type(e).__name__}: {e}"
+                self._drop_connection()
+            if attempt == self.retries:
+                raise UploadError(f"batch {index}: gave up after {attempt + 1} attempts ({problem})")
+            with self._lock:
+                self.retried += 1
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(delay)
+
+    def close(self):
+        self._pool.shutdown()
+
+    def upload(self, probe_name, batches, skip=0, on_ack=None):
+        """
+        Send batches, skipping the first `skip`. on_ack(n) is called whenever
+        the first n batches have all been acknowledged. Returns the batch count.
+        """
+        acked, watermark, pending = set(), skip, {}
+        total, sent_kind = skip, None
+
+        def collect(done):
+            """Record the acknowledged batches among done, then raise the first failure."""
+            nonlocal watermark
+            error = None
+            for future in done:
+                index = pending.pop(future)
+                if future.cancelled():
+                    continue
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                acked.add(index)
+            advanced = watermark
+            while watermark in acked:
+                acked.discard(watermark)
+                watermark += 1
+            if watermark != advanced and on_ack:
+                on_ack(watermark)
+            if error is not None:
+                raise error
+
+        try:
+            for index, (kind, batch) in enumerate(batches):
+                total = index + 1
+                if index < skip:
+                    continue
+                if kind != sent_kind and pending:
+                    # nodes must be stored before edges that point at them
+                    collect(wait(pending)[0])
+                sent_kind = kind
+                body = _dumps({"probeName": probe_name,
+                               "nodes": batch if kind == "node" else [],
+                               "edges": batch if kind == "edge" else []}).encode("utf-8")
+                pending[self._pool.submit(self.post, body, index)] = index
+                while len(pending) >= 2 * self.concurrency:
+                    collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+        except BaseException:
+            # keep what the batches still in flight manage to store
+            for future in pending:
+                future.cancel()
+            try:
+                collect(wait(pending)[0])
+            except UploadError:
+                pass
+            raise
+        return total
+
+
+def upload_file(path, uploader, batch_size=1000, state=None, fmt=None):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    skip = state.acked(path, uploader.url, stat, batch_size) if state else 0
+    probe_name, items = read_graph(path, fmt)
+    if skip:
+        print(f"[INFO] Resuming {path} after batch {skip}")
+
+    def on_ack(n):
+        if state:
+            state.save(path, uploader.url, stat, batch_size, n)
+
+    started = time.perf_counter()
+    total = uploader.upload(probe_name, iter_batches(items, batch_size), skip, on_ack)
+    if state:
+        state.forget(path, uploader.url)
+    print(f"[OK] Uploaded {path} ({probe_name}): {total - skip} batches "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            fail = random.random() < server.fail_rate
+        if fail:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            graph = json.loads(body)
+        except ValueError:
+            self.send_response(400)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with server.lock:
+            server.batches.add((graph.get("probeName"), self.headers.get("X-Probe-Batch")))
+            server.nodes += len(graph.get("nodes", ()))
+            server.edges += len(graph.get("edges", ()))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stub(port, fail_rate=0.0, host="127.0.0.1"):
+    """Local stand-in for the SST import endpoint; runs until interrupted."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.lock = threading.Lock()
+    server.fail_rate = fail_rate
+    server.requests = server.nodes = server.edges = 0
+    server.connections, server.batches = set(), set()
+    print(f"[INFO] Stub SST server on http://{host}:{server.server_port}/ (fail rate {fail_rate})")
+    # stop cleanly on SIGTERM too, and on SIGINT even when started in the background
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[INFO] {server.requests} requests over {len(server.connections)} connections: "
+              f"{len(server.batches)} distinct batches, {server.nodes} nodes, {server.edges} edges")
+
+
+def parse_header(value):
+    name, sep, header_value = value.partition(":")
+    if not sep or not name.strip():
+        raise argparse.ArgumentTypeError(f"expected NAME:VALUE, got {value!r}")
+    return name.strip(), header_value.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m probehub.upload",
+                                     description="Upload probe graphs to an SST server in batches.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    send = commands.add_parser("send", help="Upload graph files")
+    send.add_argument("files", nargs="+", help="Graph files written by the probes (json/ndjson, optionally .gz)")
+    send.add_argument("--url", required=True, help="SST endpoint the graph documents are POSTed to")
+    send.add_argument("--batch-size", type=int, default=1000,
+                      help="Nodes or edges per request (default: 1000)")
+    send.add_argument("--concurrency", type=int, default=4,
+                      help="Requests in flight at a time, one connection each (default: 4)")
+    send.add_argument("--retries", type=int, default=5,
+                      help="Retries per batch before giving up (default: 5)")
+    send.add_argument("--backoff", type=float, default=0.5,
+                      help="Initial retry delay in seconds, doubled on every retry (default: 0.5)")
+    send.add_argument("--timeout", type=float, default=60.0,
+                      help="Socket timeout per request in seconds (default: 60)")
+    send.add_argument("-H", "--header", type=parse_header, action="append", default=[],
+                      help="Extra request header NAME:VALUE, e.g. for authentication (repeatable)")
+    send.add_argument("--format", choices=("json", "ndjson"),
+                      help="Layout of the files (default: from the file extension)")
+    send.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                      help="Directory holding the resume state upload-state.sqlite (default: ~/.cache/probe-hub)")
+    send.add_argument("--no-resume", action="store_true",
+                      help="Start every file from its first batch and keep no resume state")
+
+    stub = commands.add_parser("stub", help="Run a local stand-in SST server")
+    stub.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    stub.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    stub.add_argument("--fail-rate", type=float, default=0.0,
+                      help="Fraction of requests answered with 503, to exercise retries (default: 0)")
+
+    args = parser.parse_args(argv)
+    if args.command == "stub":
+        serve_stub(args.port, args.fail_rate, args.host)
+        return 0
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    try:
+        uploader = Uploader(args.url, args.concurrency, args.retries, args.backoff,
+                            args.timeout, dict(args.header))
+    except ValueError as e:
+        parser.error(str(e))
+    state = None if args.no_resume else UploadState(os.path.join(args.cache_dir, "upload-state.sqlite"))
+    try:
+        for path in args.files:
+            upload_file(path, uploader, args.batch_size, state, args.format)
+    except UploadError as e:
+        print(f"[ERROR] {e}")
+        if state:
+            print("[INFO] Run the same command again to resume after the last acknowledged batch")
+        return 1
+    finally:
+        uploader.close()
+        if state:
+            state.close()
+        print(f"[INFO] {uploader.requests} requests, {uploader.retried} retries")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "dynamicCallStack"))
+from dynamicCall import EdgeStore, MethodTable, graph_edges, ingest_folded
+
+
+def test_recursive_folded_stack_keeps_leaf_self_time(tmp_path):
+    profile = tmp_path / "recursive.folded"
+    profile.write_text("p.A.r();p.B.r();p.A.r();p.B.r() 5\n", encoding="utf-8")
+    table, store = MethodTable("p."), EdgeStore()
+
+    ingest_folded(str(profile), table, store)
+
+    weights = {(e["from"]["propertyValue"], e["to"]["propertyValue"]): (e["totalTime"], e["selfTime"])
+               for e in graph_edges(table, store)}
+    assert weights == {("p.A.r()", "p.B.r()"): (5.0, 5.0), ("p.B.r()", "p.A.r()"): (5.0, 0.0)}
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "dependecyAnalyzer"))
+from pom_resolver import PomResolver
+
+
+def write_pom(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<project><modelVersion>4.0.0</modelVersion>{body}</project>")
+
+
+def dependency(group_id, artifact_id, version, scope=None):
+    scope = f"<scope>{scope}</scope>" if scope else ""
+    return (f"<dependency><groupId>{group_id}</groupId><artifactId>{artifact_id}</artifactId>"
+            f"<version>{version}</version>{scope}</dependency>")
+
+
+def test_child_dependency_overrides_parent(tmp_path):
+    repository = tmp_path / "repository"
+    write_pom(str(repository / "org" / "lib" / "core" / "1.0" / "core-1.0.pom"),
+              "<groupId>org.lib</groupId><artifactId>core</artifactId><version>1.0</version>"
+              f"<dependencies>{dependency('org.dep', 'x', '1.0')}</dependencies>")
+    write_pom(str(tmp_path / "pom.xml"),
+              "<groupId>org.app</groupId><artifactId>parent</artifactId><version>1</version>"
+              "<packaging>pom</packaging>"
+              f"<dependencies>{dependency('org.lib', 'core', '1.0', 'test')}</dependencies>")
+    write_pom(str(tmp_path / "child" / "pom.xml"),
+              "<parent><groupId>org.app</groupId><artifactId>parent</artifactId>"
+              "<version>1</version></parent><artifactId>child</artifactId>"
+              f"<dependencies>{dependency('org.lib', 'core', '1.0', 'compile')}</dependencies>")
+
+    resolved = PomResolver(str(repository)).resolve(str(tmp_path / "child" / "pom.xml"))
+
+    scopes = {(d["groupId"], d["artifactId"]): (d["scope"], d["depth"]) for d in resolved}
+    assert scopes == {("org.lib", "core"): ("compile", 1), ("org.dep", "x"): ("compile", 2)}